@@ -1,37 +1,134 @@
 from django.contrib import admin
-from django import forms
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+
 from .models import User, Category, Listing, Comment, Bid
 from .forms import BidFormSet
 
+# Bids listed, read-only, on a listing's change page
+INLINE_BIDS = 50
+# Unfiltered changelists of tables larger than this show an estimated count
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(model, using):
+    """
+    A cheap row count estimate: the planner statistics on PostgreSQL, the
+    highest id elsewhere. None if the table has never been analyzed.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] >= 0 else None
+    return model._default_manager.using(using).aggregate(Max("pk"))["pk__max"] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for changelists of very large tables: the unfiltered count
+    is estimated instead of running COUNT(*) over the whole table. The
+    last pages may then be empty, which the changelist reports as an
+    invalid page.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skips the second COUNT(*) for the "N total" link of filtered lists
+    show_full_result_count = False
+
 
-class BidInline(admin.StackedInline):
+class NewBidInline(admin.StackedInline):
     model = Bid
     extra = 1
     formset = BidFormSet
+    fields = ('user', 'bid')
+    raw_id_fields = ('user',)
+    verbose_name_plural = 'New bid'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).none()
 
-class ListingAdmin(admin.ModelAdmin):
+
+class ListingAdmin(LargeTableAdmin):
     list_display = (
         'title',
-        'description', 
+        'description',
         'category',
         'owner',
         'starting_price',
         'current_price',
         'active'
     )
-    readonly_fields = ('price', 'current_price')
-    exclude = ('price',)  # Hide the FK price field - it's auto-managed
-    inlines = [BidInline]
-    
-    def current_price(self, obj):
-        """Show current price in admin list"""
-        return obj.current_price
-    current_price.short_description = 'Current Price'
+    list_select_related = ('category', 'owner')
+    search_fields = ('title',)
+    # The watchers of a popular listing are too many to edit in a form;
+    # users manage them from their watchlist
+    exclude = ('price', 'watchlist')  # Hide the FK price field - it's auto-managed
+    readonly_fields = ('current_price', 'bid_count', 'last_bid_at', 'recent_bids')
+    raw_id_fields = ('owner', 'winner')
+    inlines = [NewBidInline]
+
+    @admin.display(description=f'Latest {INLINE_BIDS} bids')
+    def recent_bids(self, obj):
+        """
+        A plain table rather than an inline, whose forms would all be posted
+        and validated on every save; older bids are in the bid changelist
+        """
+        if obj is None or obj.pk is None:
+            return '-'
+        bids = Bid.objects.filter(listing=obj).select_related('user').order_by(
+            '-created_at', '-id'
+        )[:INLINE_BIDS]
+        rows = format_html_join('', '<tr><td><a href="{}">{}</a></td><td>{}</td><td>{}</td></tr>', (
+            (reverse('admin:auctions_bid_change', args=(bid.pk,)), bid.bid, bid.user, bid.created_at)
+            for bid in bids
+        ))
+        if not rows:
+            return 'No bids yet'
+        return format_html(
+            '<table><thead><tr><th>Bid</th><th>User</th><th>Placed</th></tr></thead>'
+            '<tbody>{}</tbody></table>', rows
+        )
+
+
+class UserAdmin(LargeTableAdmin):
+    list_display = ('username', 'email', 'is_staff', 'date_joined')
+    search_fields = ('username', 'email')
+
+
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('__str__', 'created_at')
+    list_select_related = ('user', 'listing')
+    raw_id_fields = ('user', 'listing')
+
+
+class BidAdmin(LargeTableAdmin):
+    list_display = ('__str__', 'bid', 'created_at')
+    list_select_related = ('user', 'listing')
+    raw_id_fields = ('user', 'listing')
 
 
-admin.site.register(User)
+admin.site.register(User, UserAdmin)
 admin.site.register(Category)
 admin.site.register(Listing, ListingAdmin)
-admin.site.register(Comment)
-admin.site.register(Bid)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Bid, BidAdmin)
@@ -0,0 +1,140 @@
+"""
+Read-only JSON API over the same querysets as the HTML pages.
+
+Every response carries a strong ETag built from the version of each
+listing it contains (bumped on every bid, close and edit) and, where
+category names are embedded, from the categories cache version. A client
+or reverse proxy revalidating with If-None-Match gets a 304 without the
+response being serialized. The ETag functions load what the view needs
+and leave it on the request, so a full response costs no extra queries.
+"""
+import hashlib
+
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from .cache import get_categories, get_category, get_version
+from .models import Listing
+from .pagination import InvalidCursor, paginate
+from .routers import replica_reads
+
+
+def listing_json(listing):
+    return {
+        "id": listing.id,
+        "title": listing.title,
+        "description": listing.description,
+        "image": listing.image,
+        "category": listing.category.name,
+        "starting_price": str(listing.starting_price),
+        "current_price": str(listing.current_price),
+        "bid_count": listing.bid_count,
+        "last_bid_at": listing.last_bid_at and listing.last_bid_at.isoformat(),
+        "active": listing.active,
+        "created_at": listing.created_at.isoformat(),
+        "ends_at": listing.ends_at and listing.ends_at.isoformat(),
+        "version": listing.version,
+    }
+
+
+def listings_etag(prefix, listings):
+    """A strong ETag changing whenever any of the listings or categories does"""
+    digest = hashlib.sha1(
+        ",".join(f"{listing.pk}:{listing.version}" for listing in listings).encode()
+    ).hexdigest()[:20]
+    return f"{prefix}-c{get_version('categories')}-{digest}"
+
+
+def error(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+def listings_page_etag(request):
+    listings = Listing.objects.active().feed()
+    category_name = request.GET.get("category")
+    if category_name:
+        category = get_category(category_name)
+        if category is None:
+            return None
+        listings = listings.filter(category=category)
+    try:
+        request.api_page = paginate(listings, request.GET.get("cursor"))
+    except InvalidCursor:
+        return None
+    return listings_etag("listings", request.api_page)
+
+
+@replica_reads
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=listings_page_etag)
+def listings(request):
+    """Active listings, newest first, optionally ?category=, paged by ?cursor="""
+    page = getattr(request, "api_page", None)
+    if page is None:
+        return error("Unknown category or invalid cursor", 404)
+    return JsonResponse({
+        "listings": [listing_json(listing) for listing in page],
+        "next_cursor": page.next_cursor
+    })
+
+
+def listing_etag(request, id):
+    request.api_listing = Listing.objects.select_related(
+        "category", "owner", "winner"
+    ).filter(pk=id).first()
+    if request.api_listing is None:
+        return None
+    return listings_etag("listing", [request.api_listing])
+
+
+@replica_reads
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=listing_etag)
+def listing(request, id):
+    listing = request.api_listing
+    if listing is None:
+        return error("No listing with this id", 404)
+    return JsonResponse({
+        **listing_json(listing),
+        "owner": listing.owner.username,
+        "winner": listing.winner and listing.winner.username,
+    })
+
+
+def categories_etag(request):
+    return f"categories-v{get_version('categories')}"
+
+
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=categories_etag)
+def categories(request):
+    return JsonResponse({
+        "categories": [
+            {"id": category.id, "name": category.name}
+            for category in get_categories()
+        ]
+    })
+
+
+def watchlist_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    request.api_watchlist = list(
+        Listing.objects.feed().filter(watchlist=request.user).order_by("-created_at", "-id")
+    )
+    return listings_etag(f"watchlist-u{request.user.pk}", request.api_watchlist)
+
+
+@replica_reads
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=watchlist_etag)
+def watchlist(request):
+    """The signed-in user's watched listings, newest first"""
+    if not request.user.is_authenticated:
+        return error("Authentication required", 401)
+    return JsonResponse({
+        "listings": [listing_json(listing) for listing in request.api_watchlist]
+    })
@@ -0,0 +1,158 @@
+"""
+ASGI-native versions of the read-heavy views in views.py.
+
+They use the async ORM and await the independent queries of a page
+together, so under the ASGI entry point a request does not hold a worker
+thread while it waits on the database. Templates must not trigger lazy
+queries here: everything they read is fetched up front.
+"""
+import asyncio
+
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponseRedirect
+from django.shortcuts import render
+from django.urls import reverse
+
+from .cache import aget_categories
+from .feeds import atrending_listings, ending_soon_listings
+from .models import Listing
+from .pagination import InvalidCursor, apaginate
+from .routers import replica_reads
+from .views import COMMENT_PAGE_SIZE, ENDING_SOON, TRENDING
+
+
+async def alisting_page(request, listings):
+    """Returns the page of listings requested by the ?cursor= parameter"""
+    try:
+        return await apaginate(listings, request.GET.get("cursor"))
+    except InvalidCursor:
+        raise Http404("Invalid page cursor")
+
+
+async def resolve_user(request):
+    # Resolve the lazy request.user now; the auth context processor would
+    # otherwise load it synchronously while rendering.
+    request.user = await request.auser()
+    return request.user
+
+
+@replica_reads
+async def index(request):
+    page, categories, user = await asyncio.gather(
+        alisting_page(request, Listing.objects.active().feed()),
+        aget_categories(),
+        resolve_user(request)
+    )
+    return render(
+        request,
+        "auctions/index.html",
+        {
+            "listings": page.items,
+            "page": page,
+            "watched_ids": await Listing.objects.awatched_ids(user, page),
+            "categories": categories,
+            "selected_category": None
+        })
+
+
+@replica_reads
+async def trending(request):
+    listings, categories, user = await asyncio.gather(
+        atrending_listings(), aget_categories(), resolve_user(request)
+    )
+    return render(request, "auctions/feed.html", {
+        **TRENDING,
+        "listings": listings,
+        "watched_ids": await Listing.objects.awatched_ids(user, listings),
+        "categories": categories
+    })
+
+
+@replica_reads
+async def ending_soon(request):
+    async def listings():
+        return [listing async for listing in ending_soon_listings()]
+
+    listings, categories, user = await asyncio.gather(
+        listings(), aget_categories(), resolve_user(request)
+    )
+    return render(request, "auctions/feed.html", {
+        **ENDING_SOON,
+        "listings": listings,
+        "watched_ids": await Listing.objects.awatched_ids(user, listings),
+        "categories": categories
+    })
+
+
+@replica_reads
+async def listing(request, id):
+    try:
+        listing, user = await asyncio.gather(
+            Listing.objects.select_related(
+                "category", "owner", "winner"
+            ).aget(id=id),
+            resolve_user(request)
+        )
+    except Listing.DoesNotExist:
+        raise Http404("No Listing matches the given query.")
+
+    isListingInWatchlist, comments, categories = await asyncio.gather(
+        listing.ais_watched_by(user),
+        apaginate(
+            listing.listing_comments.select_related("user"),
+            page_size=COMMENT_PAGE_SIZE
+        ),
+        aget_categories()
+    )
+    isOwner = user.is_authenticated and user.pk == listing.owner_id
+    return render(request, "auctions/listing.html", {
+        "listing": listing,
+        "active": listing.active,
+        "isListingInWatchlist": isListingInWatchlist,
+        "comments": comments,
+        "isOwner": isOwner,
+        "categories": categories
+    })
+
+
+@replica_reads
+async def display_category(request):
+    category_name = request.GET.get("category", "")
+    categories, user = await asyncio.gather(aget_categories(), resolve_user(request))
+
+    # "All Categories" (empty value) and unknown names fall back to the index
+    category = next((c for c in categories if c.name == category_name), None)
+    if category is None:
+        return HttpResponseRedirect(reverse("index"))
+    page = await alisting_page(
+        request, Listing.objects.active().feed().filter(category=category)
+    )
+    return render(
+        request,
+        "auctions/index.html",
+        {
+            "listings": page.items,
+            "page": page,
+            "watched_ids": await Listing.objects.awatched_ids(user, page),
+            "categories": categories,
+            "selected_category": category_name
+        })
+
+
+@replica_reads
+async def watchlist(request):
+    user, categories = await asyncio.gather(
+        resolve_user(request), aget_categories()
+    )
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), reverse("login"))
+    listings = [
+        listing async for listing in
+        Listing.objects.feed().filter(watchlist=user).with_watch_digest(user)
+    ]
+    await user.amark_watchlist_seen()
+    return render(request, "auctions/watchlist.html", {
+        "listings": listings,
+        "outbid_count": sum(listing.outbid for listing in listings),
+        "categories": categories
+    })
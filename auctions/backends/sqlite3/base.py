@@ -0,0 +1,55 @@
+"""
+SQLite tuned for a single node serving concurrent requests.
+
+Selected with AUCTIONS_SQLITE_TUNED=1. Every new connection switches to
+WAL, so readers no longer block the writer, relaxes fsyncs to
+synchronous=NORMAL (durable across application crashes, may lose the
+last transactions on power loss), memory-maps the database and waits for
+locks instead of failing at once. Transactions opened by
+auctions.db.write_transaction() start with BEGIN IMMEDIATE, taking the
+write lock up front instead of failing with "database is locked" when
+upgrading a read lock. Before that they queue on a per-process lock, so
+the threads of one process hand the write lock over as soon as it is
+released rather than polling for it in SQLite's busy handler.
+"""
+import threading
+from collections import defaultdict
+
+from django.db.backends.sqlite3 import base
+
+# Overridable through OPTIONS["pragmas"] in the database settings
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 5000,
+}
+
+# The write queue of each database file, shared by the process's threads
+WRITE_LOCKS = defaultdict(threading.Lock)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    begin_immediate = False
+
+    @property
+    def write_lock(self):
+        return WRITE_LOCKS[self.settings_dict["NAME"]]
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop("pragmas", {})}
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.begin_immediate:
+            self.begin_immediate = False
+            self.cursor().execute("BEGIN IMMEDIATE")
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connection
+from django.test import override_settings
+from django.urls import include, path
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(samples):
+    """Latency summary, in milliseconds, of samples measured in seconds"""
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+@contextmanager
+def test_database():
+    """
+    Runs the block against a freshly migrated throwaway database, like the
+    test runner does, so benchmarks never touch the development data.
+    """
+    old_name = connection.settings_dict["NAME"]
+    old_test_name = connection.settings_dict["TEST"].get("NAME")
+    if connection.vendor == "sqlite":
+        # A file rather than the shared in-memory database, whose table
+        # level locks would serialize concurrent readers
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            tempfile.gettempdir(), "auctions_benchmark.sqlite3"
+        )
+    try:
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # The test client talks to "testserver", as one user from one
+            # address that would soon run into the rate limits
+            with override_settings(ALLOWED_HOSTS=["testserver"], AUCTIONS_RATE_LIMIT=False):
+                yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        # Later test databases of this process get their usual name
+        connection.settings_dict["TEST"]["NAME"] = old_test_name
+
+
+def url_conf(read_views):
+    """A root URLconf serving the auctions app with the given read views"""
+    from .urls import build_urlpatterns
+
+    # A class rather than a module: URL resolvers only need it hashable
+    return type("URLConf", (), {
+        "urlpatterns": [path("", include(build_urlpatterns(read_views)))]
+    })
+
+
+def seed_dataset(listings=200, bids_per_listing=5, comments_per_listing=5, watchers=20):
+    """
+    Bulk inserts a small marketplace and returns (user, listing ids). The
+    returned user watches every listing.
+    """
+    from .models import Bid, Category, Comment, Listing, User
+
+    users = User.objects.bulk_create(
+        User(username=f"bench{i}", password="!") for i in range(watchers + 1)
+    )
+    categories = Category.objects.bulk_create(
+        Category(name=f"Category {i}") for i in range(8)
+    )
+    owner = users[0]
+    rows = Listing.objects.bulk_create(
+        Listing(
+            title=f"Listing {i}",
+            description=f"Description of listing {i}",
+            starting_price=Decimal("10.00"),
+            current_price=Decimal("10.00"),
+            category=categories[i % len(categories)],
+            owner=owner,
+        )
+        for i in range(listings)
+    )
+    Bid.objects.bulk_create(
+        Bid(bid=Decimal(11 + n), user=users[1 + n % watchers], listing=listing)
+        for listing in rows for n in range(bids_per_listing)
+    )
+    Comment.objects.bulk_create(
+        Comment(comment=f"Comment {n}", user=users[1 + n % watchers], listing=listing)
+        for listing in rows for n in range(comments_per_listing)
+    )
+    Listing.watchlist.through.objects.bulk_create(
+        Listing.watchlist.through(listing=listing, user=user)
+        for listing in rows for user in users[1:]
+    )
+    Listing.objects.refresh_bid_aggregates()
+    return users[1], [listing.pk for listing in rows]
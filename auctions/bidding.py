@@ -0,0 +1,98 @@
+import enum
+import random
+import time
+from decimal import Decimal
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .db import write_transaction
+from .events import publish_listing_event
+from .feeds import bump_bid_score
+from .models import Bid, Listing
+
+# Lock contention ("database is locked", lock timeouts) is retried with
+# exponential backoff before giving up.
+MAX_RETRIES = 8
+RETRY_DELAY = 0.005
+
+
+class BidOutcome(enum.Enum):
+    ACCEPTED = "accepted"
+    OUTBID = "outbid"
+    CLOSED = "closed"
+
+
+class BidResult:
+    def __init__(self, outcome, current_price, bid=None):
+        self.outcome = outcome
+        self.current_price = current_price
+        self.bid = bid
+
+    @property
+    def accepted(self):
+        return self.outcome is BidOutcome.ACCEPTED
+
+    def __repr__(self):
+        return f"<BidResult {self.outcome.value} at {self.current_price}>"
+
+
+def place_bid(listing_id, user, amount):
+    """
+    Places a bid of `amount` by `user` on a listing without races.
+
+    Acceptance is decided by one conditional UPDATE that only matches while
+    the listing is open (active and before its end time) and its current
+    price is below the bid, so of two concurrent bids at most one can win
+    each price level, and the price FK always ends up on the highest
+    accepted bid. Raises Listing.DoesNotExist for unknown listings.
+    """
+    amount = Decimal(amount)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return _place_bid(listing_id, user, amount)
+        except OperationalError:
+            # Inside an outer transaction the whole unit has to be retried
+            if connection.in_atomic_block or attempt == MAX_RETRIES:
+                raise
+            time.sleep(RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def _place_bid(listing_id, user, amount):
+    with write_transaction():
+        now = timezone.now()
+        open_listing = Q(ends_at__isnull=True) | Q(ends_at__gt=now)
+        accepted = Listing.objects.filter(
+            open_listing, pk=listing_id, active=True, current_price__lt=amount
+        ).update(
+            version=F("version") + 1,
+            current_price=amount,
+            bid_count=F("bid_count") + 1,
+            last_bid_at=now
+        )
+        if not accepted:
+            listing = Listing.objects.values(
+                "active", "ends_at", "current_price"
+            ).get(pk=listing_id)
+            if listing["active"] and (
+                listing["ends_at"] is None or listing["ends_at"] > now
+            ):
+                outcome = BidOutcome.OUTBID
+            else:
+                # Past its end time but not swept by expire_auctions yet
+                outcome = BidOutcome.CLOSED
+            return BidResult(outcome, listing["current_price"])
+
+        # The UPDATE above holds the listing's row lock until commit, so no
+        # other bid can move the price between it and these writes.
+        bid = Bid(bid=amount, user=user, listing_id=listing_id, created_at=now)
+        bid.save(sync_listing=False)
+        Listing.objects.filter(pk=listing_id).update(price=bid)
+        publish_listing_event(
+            listing_id, "bid", price=str(amount), bidder=user.get_username()
+        )
+        # robust: a failed bump after the commit must not make place_bid
+        # retry a bid that was already placed
+        transaction.on_commit(lambda: bump_bid_score(listing_id), robust=True)
+    return BidResult(BidOutcome.ACCEPTED, amount, bid)
@@ -0,0 +1,51 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .models import Category
+
+CATEGORY_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def get_version(name):
+    """
+    Returns the current version stamp for a family of cache keys. Stamps
+    start from the clock so an evicted stamp never resurrects old entries.
+    """
+    key = f"{name}:version"
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Invalidates every key built on the current version stamp of `name`"""
+    key = f"{name}:version"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def get_categories():
+    key = f"categories:v{get_version('categories')}"
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.all())
+        cache.set(key, categories, CATEGORY_CACHE_TIMEOUT)
+    return categories
+
+
+async def aget_categories():
+    return await sync_to_async(get_categories)()
+
+
+def get_category(name):
+    """Looks a category up by name in the cached list, or returns None"""
+    for category in get_categories():
+        if category.name == name:
+            return category
+    return None
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_categories
+
+
+def categories(request):
+    """Makes the cached category list available to every template"""
+    return {"categories": SimpleLazyObject(get_categories)}
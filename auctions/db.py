@@ -0,0 +1,21 @@
+from contextlib import ExitStack, contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+@contextmanager
+def write_transaction(using=None):
+    """
+    transaction.atomic() for short write paths. On the tuned SQLite backend
+    the outermost one waits its turn in the process's write queue and takes
+    the write lock when it begins; elsewhere it is a plain atomic block.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    tuned = hasattr(connection, "begin_immediate")
+    with ExitStack() as stack:
+        if tuned and not connection.in_atomic_block:
+            stack.enter_context(connection.write_lock)
+            connection.begin_immediate = True
+            stack.callback(setattr, connection, "begin_immediate", False)
+        with transaction.atomic(using=using):
+            yield
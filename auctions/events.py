@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Events a subscriber may fall behind by before the oldest are dropped
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    """One listener's queue, bound to the event loop that created it"""
+
+    def __init__(self, broker, channel, queue_size=QUEUE_SIZE):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def deliver(self, event):
+        # Runs on self.loop; a slow consumer loses old events, never blocks
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+
+class InProcessBroker:
+    """
+    Pub/sub fan-out between the threads and event loops of one process.
+
+    Events published by other processes, such as the expire_auctions
+    worker, never reach its subscribers; listing streams announce the
+    closures at the end time themselves. Any broker with the same
+    subscribe()/publish() interface can replace it through the
+    AUCTIONS_EVENT_BROKER setting, e.g. to reach subscribers served by
+    other processes.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Must be called from the event loop that will consume events"""
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscriptions.get(channel, ()))
+
+    def publish(self, channel, event):
+        """Thread-safe; returns the number of subscribers reached"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        # One wake-up per event loop rather than one per subscriber
+        by_loop = defaultdict(list)
+        for subscription in subscriptions:
+            by_loop[subscription.loop].append(subscription)
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(deliver_all, group, event)
+            except RuntimeError:
+                # The subscribers' loop is closed
+                for subscription in group:
+                    self.unsubscribe(subscription)
+        return len(subscriptions)
+
+
+def deliver_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.deliver(event)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.AUCTIONS_EVENT_BROKER)()
+
+
+def listing_channel(listing_id):
+    return f"listing:{listing_id}"
+
+
+def publish_listing_event(listing_id, event_type, **data):
+    """Broadcasts a listing event once the current transaction commits"""
+    event = {"type": event_type, "listing": listing_id, **data}
+    transaction.on_commit(
+        lambda: get_broker().publish(listing_channel(listing_id), event)
+    )
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,216 @@
+"""
+Streaming exports of listings, bids, comments and watchlist entries for
+analytics, used by the export_data command and the staff-only export view.
+
+Rows are read with iterator(), which uses a server-side cursor on
+PostgreSQL, and are encoded a chunk at a time, so an export of any size
+holds only one chunk in memory. Users are exported by id only.
+
+Parquet output needs pyarrow (pip install pyarrow). Each chunk becomes a
+row group, written out as soon as it is encoded.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from .models import Bid, Comment, Listing
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# (column, lookup, type) of each dataset, in the order they are exported
+DATASETS = {
+    "listings": (Listing, [
+        ("id", "id", "int"),
+        ("title", "title", "text"),
+        ("description", "description", "text"),
+        ("category", "category__name", "text"),
+        ("owner_id", "owner_id", "int"),
+        ("starting_price", "starting_price", "decimal"),
+        ("current_price", "current_price", "decimal"),
+        ("bid_count", "bid_count", "int"),
+        ("last_bid_at", "last_bid_at", "datetime"),
+        ("active", "active", "bool"),
+        ("winner_id", "winner_id", "int"),
+        ("created_at", "created_at", "datetime"),
+        ("ends_at", "ends_at", "datetime"),
+    ]),
+    "bids": (Bid, [
+        ("id", "id", "int"),
+        ("listing_id", "listing_id", "int"),
+        ("user_id", "user_id", "int"),
+        ("amount", "bid", "decimal"),
+        ("created_at", "created_at", "datetime"),
+    ]),
+    "comments": (Comment, [
+        ("id", "id", "int"),
+        ("listing_id", "listing_id", "int"),
+        ("user_id", "user_id", "int"),
+        ("comment", "comment", "text"),
+        ("created_at", "created_at", "datetime"),
+    ]),
+    "watchlist": (Listing.watchlist.through, [
+        ("listing_id", "listing_id", "int"),
+        ("user_id", "user_id", "int"),
+    ]),
+}
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def export_queryset(dataset, using=None):
+    """The dataset's rows as value tuples in primary key order"""
+    model, columns = DATASETS[dataset]
+    queryset = model._default_manager.order_by("pk").values_list(
+        *[lookup for _, lookup, _ in columns]
+    )
+    return queryset.using(using) if using else queryset
+
+
+def text_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    return str(value)
+
+
+class CSVEncoder:
+    def __init__(self, columns):
+        self.columns = columns
+
+    def header(self):
+        return self.write([[name for name, _, _ in self.columns]])
+
+    def write(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [["" if value is None else text_value(value) for value in row] for row in rows]
+        )
+        return buffer.getvalue().encode()
+
+    def close(self):
+        return b""
+
+
+class JSONLinesEncoder:
+    def __init__(self, columns):
+        self.names = [name for name, _, _ in columns]
+
+    def header(self):
+        return b""
+
+    def write(self, rows):
+        return "".join(
+            json.dumps(dict(zip(self.names, map(text_value, row)))) + "\n"
+            for row in rows
+        ).encode()
+
+    def close(self):
+        return b""
+
+
+class Sink(io.RawIOBase):
+    """A write-only file whose contents are taken out as they are written"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ParquetEncoder:
+    def __init__(self, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportUnavailable("Parquet export needs pyarrow (pip install pyarrow)")
+        self.pyarrow = pyarrow
+        types = {
+            "int": pyarrow.int64(),
+            "text": pyarrow.string(),
+            "decimal": pyarrow.decimal128(10, 2),
+            "datetime": pyarrow.timestamp("us", tz="UTC"),
+            "bool": pyarrow.bool_(),
+        }
+        self.schema = pyarrow.schema(
+            [(name, types[kind]) for name, _, kind in columns]
+        )
+        self.sink = Sink()
+        self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema)
+
+    def header(self):
+        return self.sink.drain()
+
+    def write(self, rows):
+        self.writer.write_table(self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(column, type=field.type)
+             for column, field in zip(zip(*rows), self.schema)],
+            schema=self.schema
+        ))
+        return self.sink.drain()
+
+    def close(self):
+        self.writer.close()
+        return self.sink.drain()
+
+
+ENCODERS = {
+    "csv": CSVEncoder,
+    "jsonl": JSONLinesEncoder,
+    "parquet": ParquetEncoder,
+}
+
+
+def export_encoder(dataset, fmt):
+    """Raises ExportUnavailable if the format cannot be written here"""
+    return ENCODERS[fmt](DATASETS[dataset][1])
+
+
+def export_rows(dataset, encoder, using=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields the dataset encoded as bytes, one chunk of rows at a time"""
+    rows = export_queryset(dataset, using).iterator(chunk_size=chunk_size)
+    yield encoder.header()
+    while chunk := list(islice(rows, chunk_size)):
+        yield encoder.write(chunk)
+    yield encoder.close()
+
+
+async def aexport_rows(dataset, encoder, using=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    export_rows for async views. Each chunk is fetched on the thread
+    sync_to_async runs database work on. (aiterator() cannot be used:
+    values_list() querysets run their query when it is called.)
+    """
+    rows = export_queryset(dataset, using).iterator(chunk_size=chunk_size)
+    fetch = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    yield encoder.header()
+    while chunk := await fetch():
+        yield encoder.write(chunk)
+    yield encoder.close()
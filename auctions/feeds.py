@@ -0,0 +1,143 @@
+"""
+Trending and ending-soon feeds.
+
+Trending ranks active listings by their bids in the last TRENDING_HOURS
+and their watchers. Counting those per request would scan the Bid and
+watchlist tables, so the refresh_feeds command materializes the top
+TRENDING_SIZE listings into ListingScore, and new bids and watchers bump
+the stored scores until the next refresh recounts them. Ending soon needs
+nothing materialized: it is a range scan of the (active, ends_at) index.
+"""
+import heapq
+from datetime import timedelta
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .db import write_transaction
+from .models import Bid, Listing, ListingScore
+
+TRENDING_HOURS = 24
+TRENDING_SIZE = 200
+FEED_SIZE = 24
+BID_WEIGHT = 1.0
+WATCHER_WEIGHT = 0.5
+
+
+def trending_score(recent_bids, watchers):
+    return recent_bids * BID_WEIGHT + watchers * WATCHER_WEIGHT
+
+
+def trending_candidates(since):
+    """
+    (listing id, bids since `since`, watchers) of the active listings bid on
+    since then, each count an index range scan per listing
+    """
+    bids = Bid.objects.filter(
+        listing=OuterRef("pk"), created_at__gte=since
+    ).order_by().values("listing").annotate(count=Count("pk")).values("count")
+    watchers = Listing.watchlist.through.objects.filter(
+        listing=OuterRef("pk")
+    ).order_by().values("listing").annotate(count=Count("pk")).values("count")
+    return Listing.objects.active().filter(last_bid_at__gte=since).annotate(
+        recent_bids=Coalesce(Subquery(bids), 0),
+        watchers=Coalesce(Subquery(watchers), 0),
+    ).values_list("pk", "recent_bids", "watchers")
+
+
+def refresh_trending(hours=TRENDING_HOURS, size=TRENDING_SIZE, now=None):
+    """
+    Recounts the scores and replaces ListingScore with the top `size`
+    listings, keeping only those in memory while the candidates stream by
+    """
+    now = now or timezone.now()
+    top = heapq.nlargest(
+        size,
+        trending_candidates(now - timedelta(hours=hours)).iterator(),
+        key=lambda row: (trending_score(row[1], row[2]), row[0])
+    )
+    with write_transaction():
+        ListingScore.objects.all().delete()
+        ListingScore.objects.bulk_create(
+            ListingScore(
+                listing_id=pk, recent_bids=recent_bids, watchers=watchers,
+                score=trending_score(recent_bids, watchers), updated_at=now
+            )
+            for pk, recent_bids, watchers in top
+        )
+    return len(top)
+
+
+def bump_bid_score(listing_id):
+    """
+    Counts a new bid towards the listing's trending score. Runs once the
+    bid has committed rather than in its transaction, so the bid path never
+    waits on the score table; a bump that fails is made up by the next
+    refresh.
+
+    An unranked listing only enters the table while it has fewer than
+    TRENDING_SIZE rows or by beating the lowest ranked one. That row is
+    claimed by a delete conditional on the score that was read, so of two
+    listings racing for the same slot only one takes it and the table stays
+    at its top-K size between refreshes.
+    """
+    with write_transaction():
+        updated = ListingScore.objects.filter(listing_id=listing_id).update(
+            recent_bids=F("recent_bids") + 1,
+            score=F("score") + BID_WEIGHT,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            return
+        watchers = Listing.watchlist.through.objects.filter(listing_id=listing_id).count()
+        score = trending_score(1, watchers)
+        if ListingScore.objects.count() >= TRENDING_SIZE:
+            lowest = ListingScore.objects.order_by("score", "listing_id").values_list(
+                "listing_id", "score"
+            ).first()
+            if lowest is None or score <= lowest[1]:
+                return
+            claimed, _ = ListingScore.objects.filter(
+                listing_id=lowest[0], score=lowest[1]
+            ).delete()
+            if not claimed:
+                return
+        ListingScore.objects.bulk_create([
+            ListingScore(listing_id=listing_id, recent_bids=1, watchers=watchers, score=score)
+        ], ignore_conflicts=True)
+
+
+def bump_watcher_scores(listing_ids, change):
+    """
+    Counts `change` watchers (negative when removed) towards the scores of
+    the listings already ranked; watchers alone do not make a listing trend
+    """
+    if listing_ids:
+        ListingScore.objects.filter(listing_id__in=listing_ids).update(
+            watchers=F("watchers") + change,
+            score=F("score") + change * WATCHER_WEIGHT,
+            updated_at=timezone.now(),
+        )
+
+
+def trending_scores(limit=FEED_SIZE):
+    return ListingScore.objects.filter(listing__active=True).select_related(
+        "listing__category"
+    ).order_by("-score", "-listing_id")[:limit]
+
+
+def trending_listings(limit=FEED_SIZE):
+    """The top active listings by their stored score, in one query"""
+    return [score.listing for score in trending_scores(limit)]
+
+
+async def atrending_listings(limit=FEED_SIZE):
+    return [score.listing async for score in trending_scores(limit)]
+
+
+def ending_soon_listings(limit=FEED_SIZE, now=None):
+    """Open listings closest to their end time"""
+    return Listing.objects.active().feed().filter(
+        ends_at__gt=now or timezone.now()
+    ).order_by("ends_at", "id")[:limit]
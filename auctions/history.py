@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connections, router
+
+from .models import Bid
+from .pagination import paginate
+
+HISTORY_PAGE_SIZE = 50
+SERIES_POINTS = 200
+# A series binds one parameter per point; SQLite builds before 3.32 allow
+# at most 999 per query
+MAX_SERIES_POINTS = 500
+SERIES_CACHE_TIMEOUT = 3600
+
+
+def listing_bid_history(listing_id, cursor=None):
+    """A page of a listing's bids, newest first, with the bidders' names"""
+    return paginate(
+        Bid.objects.filter(listing_id=listing_id).select_related("user").only(
+            "bid", "created_at", "user__username"
+        ),
+        cursor,
+        HISTORY_PAGE_SIZE
+    )
+
+
+def user_bid_history(user, cursor=None):
+    """A page of a user's bids, newest first, with the listings' titles"""
+    return paginate(
+        Bid.objects.filter(user=user).select_related("listing").only(
+            "bid", "created_at", "listing__title"
+        ),
+        cursor,
+        HISTORY_PAGE_SIZE
+    )
+
+
+def price_series(listing, points=SERIES_POINTS):
+    """
+    The listing's price over time as at most `points` + 1 (time, price)
+    pairs, starting from its starting price. Cached per listing version.
+    """
+    key = f"bid_series:{listing.pk}:v{listing.version}:p{points}"
+    series = cache.get(key)
+    if series is None:
+        series = [(listing.created_at, listing.starting_price)] + [
+            (bid.created_at, bid.bid) for bid in sampled_bids(listing, points)
+        ]
+        cache.set(key, series, SERIES_CACHE_TIMEOUT)
+    return series
+
+
+def sampled_bids(listing, points):
+    """
+    Downsamples a listing's bids in the database: the time from its
+    creation to its last bid is cut into `points` equal steps and, for
+    each step, the last bid placed by then is found with one seek on the
+    (listing, created_at) index. The cost grows with `points`, not with
+    the number of bids, and the price at every step is exact.
+    """
+    if listing.last_bid_at is None:
+        return []
+    connection = connections[router.db_for_read(Bid)]
+    span = max(listing.last_bid_at - listing.created_at, timedelta(0))
+    bounds = [
+        connection.ops.adapt_datetimefield_value(listing.created_at + span * step / points)
+        for step in range(1, points + 1)
+    ]
+    table = connection.ops.quote_name(Bid._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH bounds (t) AS (VALUES {", ".join(["(%s)"] * len(bounds))})
+            SELECT (
+                SELECT id FROM {table}
+                WHERE listing_id = %s AND created_at <= bounds.t
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1
+            )
+            FROM bounds
+            """,
+            bounds + [listing.pk]
+        )
+        # Steps without a new bid repeat the previous one
+        ids = {row[0] for row in cursor.fetchall()} - {None}
+    return Bid.objects.filter(pk__in=ids).only("bid", "created_at").order_by(
+        "created_at", "id"
+    )
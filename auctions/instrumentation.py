@@ -0,0 +1,146 @@
+"""
+Per-request query count, database time, template time and total latency.
+
+The timings of the request being handled live in a context variable, so
+they follow the request into the threads sync_to_async runs database work
+on. Queries are recorded by an execute wrapper installed on every database
+connection (see signals.py), and template time by the template backend
+below, which settings.TEMPLATES selects.
+"""
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+current_timings = ContextVar("current_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.start
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current request"""
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_time += time.perf_counter() - start
+        timings.queries += 1
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        timings = current_timings.get()
+        if timings is None:
+            return super().render(context, request)
+        # Templates rendered while rendering another one (render_to_string
+        # in a template tag) are already counted by the outer render
+        timings.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:
+                timings.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, timing each render"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class InstrumentationMiddleware:
+    """
+    Records the timings of every request in the Prometheus histograms of
+    metrics.py, reports them in a Server-Timing header and logs requests
+    that run more than AUCTIONS_QUERY_BUDGET queries.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = current_timings.set(RequestTimings())
+        try:
+            response = self.get_response(request)
+            self.record(request, response, current_timings.get())
+            return response
+        finally:
+            current_timings.reset(token)
+
+    async def __acall__(self, request):
+        token = current_timings.set(RequestTimings())
+        try:
+            response = await self.get_response(request)
+            self.record(request, response, current_timings.get())
+            return response
+        finally:
+            current_timings.reset(token)
+
+    def record(self, request, response, timings):
+        total_time = timings.total_time
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+
+        metrics.request_duration.observe(total_time, view=view)
+        metrics.request_db_duration.observe(timings.db_time, view=view)
+        metrics.request_template_duration.observe(timings.template_time, view=view)
+        metrics.request_queries.observe(timings.queries, view=view)
+
+        budget = settings.AUCTIONS_QUERY_BUDGET
+        if budget and timings.queries > budget:
+            metrics.query_budget_exceeded.inc(view=view)
+            logger.warning(
+                "%s %s (%s) ran %d queries, over the budget of %d",
+                request.method, request.path, view, timings.queries, budget
+            )
+
+        if settings.AUCTIONS_SERVER_TIMING:
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={timings.db_time * 1000:.1f};desc="{timings.queries} queries"',
+                f"tpl;dur={timings.template_time * 1000:.1f}",
+                f"total;dur={total_time * 1000:.1f}",
+            ])
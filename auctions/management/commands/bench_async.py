@@ -0,0 +1,109 @@
+import asyncio
+import json
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from auctions import async_views, views
+from auctions.benchmarking import seed_dataset, summarize, test_database, url_conf
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput and tail latency of the read views served '
+        'synchronously through the WSGI handler and natively through the '
+        'ASGI handler, on a seeded throwaway database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--listings', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with test_database():
+            user, listing_ids = seed_dataset(listings=options['listings'])
+            rng = random.Random(options['seed'])
+            urls = [self.pick_url(rng, listing_ids) for _ in range(options['requests'])]
+            results = {
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'wsgi': self.run_wsgi(urls, user, options['concurrency']),
+                'asgi': asyncio.run(self.run_asgi(urls, user, options['concurrency'])),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def pick_url(self, rng, listing_ids):
+        return rng.choice([
+            lambda: reverse('index'),
+            lambda: reverse('listing', args=(rng.choice(listing_ids),)),
+            lambda: reverse('display_category') + '?category=Category+3',
+            lambda: reverse('watchlist'),
+        ])()
+
+    def report(self, latencies, elapsed):
+        return {
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'latency': summarize(latencies),
+        }
+
+    def run_wsgi(self, urls, user, concurrency):
+        clients = queue.SimpleQueue()
+        for _ in range(concurrency):
+            client = Client()
+            client.force_login(user)
+            clients.put(client)
+        latencies = []
+
+        def fetch(url):
+            client = clients.get()
+            try:
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - start)
+            finally:
+                clients.put(client)
+            assert response.status_code == 200, (url, response.status_code)
+
+        with override_settings(ROOT_URLCONF=url_conf(views)):
+            self.warm_up(Client(), user, urls)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(fetch, urls))
+            return self.report(latencies, time.perf_counter() - start)
+
+    async def run_asgi(self, urls, user, concurrency):
+        latencies = []
+        pending = asyncio.Queue()
+        for url in urls:
+            pending.put_nowait(url)
+        clients = []
+        for _ in range(concurrency):
+            client = AsyncClient()
+            await client.aforce_login(user)
+            clients.append(client)
+
+        async def worker(client):
+            while not pending.empty():
+                url = pending.get_nowait()
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, (url, response.status_code)
+
+        with override_settings(ROOT_URLCONF=url_conf(async_views)):
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client) for client in clients))
+            return self.report(latencies, time.perf_counter() - start)
+
+    def warm_up(self, client, user, urls):
+        # Fill the category and card caches so both runs start warm
+        client.force_login(user)
+        for url in set(urls):
+            client.get(url)
@@ -0,0 +1,130 @@
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from auctions.benchmarking import seed_dataset, summarize, test_database
+from auctions.bidding import place_bid
+from auctions.models import Listing, User
+
+PROFILES = {'stock': '0', 'tuned': '1'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure bid write throughput on SQLite under concurrent writers '
+        'and readers, with the stock and the tuned (AUCTIONS_SQLITE_TUNED) '
+        'connection settings'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile',
+            choices=['both', *PROFILES],
+            default='both',
+            help='Connection settings to measure; both runs each in a subprocess'
+        )
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+        parser.add_argument('--listings', type=int, default=20, help='Listings the bids spread over')
+
+    def handle(self, *args, **options):
+        if options['profile'] == 'both':
+            results = {profile: self.run_profile(profile, options) for profile in PROFILES}
+        else:
+            results = self.measure(options)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_profile(self, profile, options):
+        command = [
+            sys.executable, sys.argv[0], 'bench_sqlite_writes',
+            '--profile', profile,
+            '--writers', str(options['writers']),
+            '--readers', str(options['readers']),
+            '--duration', str(options['duration']),
+            '--listings', str(options['listings']),
+        ]
+        env = {**os.environ, 'AUCTIONS_SQLITE_TUNED': PROFILES[profile]}
+        done = subprocess.run(command, env=env, capture_output=True, text=True)
+        if done.returncode:
+            raise CommandError(f'{profile} run failed:\n{done.stderr}')
+        return json.loads(done.stdout)
+
+    def measure(self, options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark only applies to SQLite')
+        with test_database():
+            user, listing_ids = seed_dataset(
+                listings=options['listings'], bids_per_listing=1,
+                comments_per_listing=0, watchers=options['writers']
+            )
+            bidders = list(User.objects.exclude(pk=Listing.objects.values('owner')[:1]))
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            connection.close()
+
+            # Every bid is higher than the last one, so each is accepted
+            amounts = itertools.count(1000)
+            amounts_lock = threading.Lock()
+            deadline = time.perf_counter() + options['duration']
+            latencies = []
+            reads = []
+            failures = []
+
+            def write(n):
+                bidder = bidders[n % len(bidders)]
+                try:
+                    while time.perf_counter() < deadline:
+                        with amounts_lock:
+                            amount = Decimal(next(amounts))
+                        start = time.perf_counter()
+                        try:
+                            place_bid(listing_ids[int(amount) % len(listing_ids)], bidder, amount)
+                        except OperationalError as e:
+                            failures.append(str(e))
+                            continue
+                        latencies.append(time.perf_counter() - start)
+                finally:
+                    connection.close()
+
+            def read():
+                try:
+                    while time.perf_counter() < deadline:
+                        start = time.perf_counter()
+                        try:
+                            list(Listing.objects.active().feed()[:24])
+                        except OperationalError as e:
+                            failures.append(str(e))
+                            continue
+                        reads.append(time.perf_counter() - start)
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=write, args=(n,)) for n in range(options['writers'])]
+            threads += [threading.Thread(target=read) for _ in range(options['readers'])]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+        return {
+            'journal_mode': journal_mode,
+            'writers': options['writers'],
+            'readers': options['readers'],
+            'bids_per_second': round(len(latencies) / elapsed, 1),
+            'reads_per_second': round(len(reads) / elapsed, 1),
+            'failed_operations': len(failures),
+            'bid_latency': summarize(latencies),
+            'read_latency': summarize(reads),
+        }
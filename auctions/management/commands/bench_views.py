@@ -0,0 +1,191 @@
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from decimal import Decimal
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from auctions.benchmarking import summarize, test_database
+from auctions.models import Category, Listing, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the hot auction views through the test client on a '
+        'seeded throwaway database and print latency percentiles, query '
+        'counts and allocations as JSON, for diffing between commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50, help='Timed requests per view')
+        parser.add_argument(
+            '--alloc-repeat',
+            type=int,
+            default=10,
+            help='Requests per view traced for allocations (0 to skip)'
+        )
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--listings', type=int, default=5000)
+        parser.add_argument('--bids-per-listing', type=int, default=20)
+        parser.add_argument('--watches', type=int, default=50, help="Size of the benchmark user's watchlist")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON here instead of stdout')
+
+    def handle(self, *args, **options):
+        with test_database():
+            started = time.perf_counter()
+            call_command(
+                'populate_testdata', '--bulk',
+                '--users', str(options['users']),
+                '--listings', str(options['listings']),
+                '--bids-per-listing', str(options['bids_per_listing']),
+                '--seed', str(options['seed']),
+                stdout=StringIO()
+            )
+            seconds_seeding = time.perf_counter() - started
+            self.rng = random.Random(options['seed'])
+            self.prepare(options)
+            results = {
+                'meta': self.meta(options, seconds_seeding),
+                'views': {
+                    name: self.run(scenario, options)
+                    for name, scenario in self.scenarios().items()
+                },
+            }
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(f"Results written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def prepare(self, options):
+        """Creates the benchmark user, its watchlist and the listings it will close"""
+        self.user = User.objects.create_user('bench', password='bench')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+        active = list(Listing.objects.active().values_list('pk', flat=True))
+        self.rng.shuffle(active)
+        # Closed listings are never reopened, so every close_auction request
+        # needs its own, across both the timed and the traced runs
+        closes = options['repeat'] + options['alloc_repeat'] + 1
+        self.to_close = active[:closes]
+        self.listing_ids = active[closes:]
+        Listing.objects.filter(pk__in=self.to_close).update(owner=self.user)
+        Listing.watchlist.through.objects.bulk_create(
+            Listing.watchlist.through(listing_id=pk, user=self.user)
+            for pk in self.rng.sample(self.listing_ids, min(options['watches'], len(self.listing_ids)))
+        )
+        self.category_names = list(Category.objects.values_list('name', flat=True))
+        # Above every seeded price, so each bid is accepted
+        self.next_bid = Decimal(1_000_000)
+
+    def scenarios(self):
+        return {
+            'index': lambda: self.client.get(reverse('index')),
+            'display_category': lambda: self.client.get(
+                reverse('display_category'),
+                {'category': self.rng.choice(self.category_names)}
+            ),
+            'listing': lambda: self.client.get(
+                reverse('listing', args=(self.rng.choice(self.listing_ids),))
+            ),
+            'watchlist': lambda: self.client.get(reverse('watchlist')),
+            'add_bid': self.add_bid,
+            'close_auction': lambda: self.client.post(
+                reverse('close_auction', args=(self.to_close.pop(),))
+            ),
+        }
+
+    def add_bid(self):
+        self.next_bid += 1
+        return self.client.post(
+            reverse('add_bid', args=(self.rng.choice(self.listing_ids),)),
+            {'bid': str(self.next_bid)}
+        )
+
+    def run(self, scenario, options):
+        # One untimed request warms the caches and the URL resolver
+        self.request(scenario)
+
+        latencies = []
+        query_counts = []
+        for _ in range(options['repeat']):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                self.request(scenario)
+                latencies.append(time.perf_counter() - start)
+            query_counts.append(len(queries))
+
+        result = {
+            'latency': summarize(latencies),
+            'queries': {
+                'min': min(query_counts),
+                'mean': round(sum(query_counts) / len(query_counts), 2),
+                'max': max(query_counts),
+            },
+        }
+        if options['alloc_repeat']:
+            result['allocations'] = self.trace(scenario, options['alloc_repeat'])
+        return result
+
+    def trace(self, scenario, repeat):
+        """Peak traced memory per request, kept apart from the timed run"""
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(repeat):
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                self.request(scenario)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+        peaks.sort()
+        return {
+            'peak_kib_p50': round(peaks[len(peaks) // 2] / 1024, 1),
+            'peak_kib_max': round(peaks[-1] / 1024, 1),
+        }
+
+    def request(self, scenario):
+        response = scenario()
+        if response.status_code >= 400:
+            raise AssertionError(f'{response.request["PATH_INFO"]} returned {response.status_code}')
+        return response
+
+    def meta(self, options, seconds_seeding):
+        return {
+            'commit': self.git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'seconds_seeding': round(seconds_seeding, 1),
+            **{
+                key: options[key] for key in (
+                    'repeat', 'alloc_repeat', 'users', 'listings',
+                    'bids_per_listing', 'watches', 'seed'
+                )
+            },
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
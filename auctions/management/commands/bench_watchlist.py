@@ -0,0 +1,70 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from auctions.benchmarking import summarize, test_database
+from auctions.models import Category, Listing, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the watchlist membership check that loads every watcher '
+        'against the indexed existence check, on one listing with a large '
+        'number of watchers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watchers', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with test_database():
+            listing, user = self.seed(options['watchers'], options['batch_size'])
+            results = {
+                'watchers': options['watchers'],
+                'load_all': self.measure(
+                    lambda: user in listing.watchlist.all(), options['repeat']
+                ),
+                'exists': self.measure(
+                    lambda: listing.is_watched_by(user), options['repeat']
+                ),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def seed(self, watchers, batch_size):
+        with transaction.atomic():
+            owner = User.objects.create(username='bench-owner', password='!')
+            category = Category.objects.create(name='Bench')
+            listing = Listing.objects.create(
+                title='Popular listing',
+                description='Watched by everyone',
+                starting_price=10,
+                category=category,
+                owner=owner,
+            )
+            users = User.objects.bulk_create(
+                (User(username=f'watcher{i}', password='!') for i in range(watchers)),
+                batch_size=batch_size,
+            )
+            Listing.watchlist.through.objects.bulk_create(
+                (Listing.watchlist.through(listing=listing, user=u) for u in users),
+                batch_size=batch_size,
+            )
+        # The last watcher sits at the end of the watcher set
+        return listing, users[-1]
+
+    def measure(self, check, repeat):
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                assert check()
+                latencies.append(time.perf_counter() - start)
+        return {
+            'queries_per_check': len(queries) / repeat,
+            'latency': summarize(latencies),
+        }
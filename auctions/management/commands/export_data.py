@@ -0,0 +1,57 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.export import (
+    DATASETS, EXPORT_CHUNK_SIZE, ENCODERS, ExportUnavailable, export_encoder,
+    export_rows
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Export listings, bids, comments and watchlist entries for analytics '
+        'as CSV, JSON Lines or Parquet (needs pyarrow), streaming the rows '
+        'in chunks so memory use stays constant'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'datasets', nargs='*', choices=list(DATASETS),
+            help='Datasets to export (default: all of them)'
+        )
+        parser.add_argument('--format', choices=list(ENCODERS), default='csv')
+        parser.add_argument(
+            '--output-dir', default='exports', help='Written as <dataset>.<format> here'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='Rows fetched and encoded at a time'
+        )
+        parser.add_argument(
+            '--database', default=None,
+            help='Database alias to read from, e.g. the replica'
+        )
+
+    def handle(self, *args, **options):
+        os.makedirs(options['output_dir'], exist_ok=True)
+        for dataset in options['datasets'] or DATASETS:
+            try:
+                encoder = export_encoder(dataset, options['format'])
+            except ExportUnavailable as e:
+                raise CommandError(str(e))
+            path = os.path.join(options['output_dir'], f"{dataset}.{options['format']}")
+            started = time.perf_counter()
+            # Written next to the target and renamed, so readers never see
+            # a partial export
+            with open(f'{path}.part', 'wb') as file:
+                for data in export_rows(
+                    dataset, encoder, options['database'], options['chunk_size']
+                ):
+                    file.write(data)
+            os.replace(f'{path}.part', path)
+            self.stdout.write(
+                f'Exported {dataset} to {path} ({os.path.getsize(path)} bytes) '
+                f'in {time.perf_counter() - started:.1f}s'
+            )
@@ -0,0 +1,356 @@
+import csv
+import json
+import os
+import time
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from auctions.db import write_transaction
+from auctions.models import Bid, Listing, User
+
+from .populate_testdata import batched
+
+# Largest amount Bid.bid can store: 10 digits, 2 of them decimals
+MAX_AMOUNT = Decimal('99999999.99')
+
+
+class Rejected(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Import bids from a CSV or JSON Lines file, in chunks that are each '
+        'validated and bulk inserted in one transaction, then rebuild the bid '
+        'aggregates and winners of the listings they belong to. Rows have a '
+        'listing (id), a user (id) or username, an amount and an optional '
+        'ISO 8601 created_at; rows without one are stamped with the import start '
+        'time plus their byte offset in microseconds, so they keep the file order. '
+        'An interrupted import resumes from its checkpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'], help='Defaults to the file extension'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Rows validated and inserted per transaction'
+        )
+        parser.add_argument(
+            '--checkpoint', help='Progress journal to resume from (default: PATH.checkpoint)'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Start from the top, ignoring an existing checkpoint'
+        )
+        parser.add_argument(
+            '--rejects', help='Append rejected rows, with the reason, to this JSON Lines file'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Listings whose aggregates are rebuilt per transaction at the end'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No such file: {path}')
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        state = read_checkpoint(checkpoint)
+        resumed = state['started_at'] is not None
+        if resumed:
+            self.stdout.write(
+                f"Resuming after {state['imported']} imported and "
+                f"{state['rejected']} rejected rows"
+            )
+        size = os.path.getsize(path)
+        self.started = time.perf_counter()
+        processed = 0
+        rejects = open(options['rejects'], 'a') if options['rejects'] else None
+        try:
+            with open(checkpoint, 'a') as journal:
+                if not resumed:
+                    # Recorded before the first chunk commits, so a resumed
+                    # run stamps rows without created_at the same way
+                    state['started_at'] = timezone.now()
+                    write_checkpoint(journal, checkpoint_entry(state, set()))
+                for records, offset in read_chunks(path, fmt, options['chunk_size'], state['offset']):
+                    bids, rejected = self.validate(records, state['started_at'])
+                    if resumed:
+                        # The previous run may have committed this chunk and
+                        # stopped before recording it
+                        bids = skip_existing(bids)
+                        resumed = False
+                    with write_transaction():
+                        insert_bids(bids)
+                    listings = {bid[0] for bid in bids}
+                    state['offset'] = offset
+                    state['imported'] += len(bids)
+                    state['rejected'] += len(rejected)
+                    state['listings'] |= listings
+                    write_checkpoint(journal, checkpoint_entry(state, listings))
+                    if rejects:
+                        for record, reason in rejected:
+                            rejects.write(json.dumps({'row': record, 'reason': reason}) + '\n')
+                    processed += len(bids) + len(rejected)
+                    self.progress(
+                        f"{offset / size:6.1%}  {state['imported']} imported, "
+                        f"{state['rejected']} rejected, "
+                        f"{processed / (time.perf_counter() - self.started):.0f} rows/s"
+                    )
+        finally:
+            if rejects:
+                rejects.close()
+
+        self.finish(sorted(state['listings']), options['batch_size'])
+        os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['imported']} bids on {len(state['listings'])} listings, "
+            f"rejected {state['rejected']} rows"
+        ))
+
+    def validate(self, records, started_at):
+        """
+        Turns a chunk of (row, byte offset) records into (listing, user,
+        amount, created_at) bids, with one query for its listings and one for
+        its users, and returns them with the rejected rows and their reasons
+        """
+        parsed, rejected = [], []
+        for record, position in records:
+            try:
+                parsed.append((record, parse_record(
+                    record, started_at + timedelta(microseconds=position)
+                )))
+            except Rejected as e:
+                rejected.append((record, str(e)))
+
+        starting_prices = dict(
+            Listing.objects.filter(
+                pk__in={row['listing'] for _, row in parsed}
+            ).values_list('pk', 'starting_price')
+        )
+        user_ids = set(
+            User.objects.filter(
+                pk__in={row['user'] for _, row in parsed if row['user'] is not None}
+            ).values_list('pk', flat=True)
+        )
+        usernames = dict(
+            User.objects.filter(
+                username__in={row['username'] for _, row in parsed if row['user'] is None}
+            ).values_list('username', 'pk')
+        )
+
+        bids = []
+        for record, row in parsed:
+            starting_price = starting_prices.get(row['listing'])
+            user_id = row['user'] if row['user'] in user_ids else usernames.get(row['username'])
+            if starting_price is None:
+                rejected.append((record, 'Unknown listing'))
+            elif user_id is None:
+                rejected.append((record, 'Unknown user'))
+            elif row['amount'] <= starting_price:
+                rejected.append((record, f'Bid is not above the starting price of {starting_price}'))
+            else:
+                bids.append((row['listing'], user_id, row['amount'], row['created_at']))
+        return bids, rejected
+
+    def finish(self, listing_ids, batch_size):
+        """Rebuilds the price, aggregates and winner of every listing imported into"""
+        for chunk in batched(listing_ids, batch_size):
+            with write_transaction():
+                listings = Listing.objects.filter(pk__in=chunk)
+                listings.refresh_bid_aggregates()
+                listings.refresh_winners()
+        self.progress(f'Bid aggregates and winners rebuilt for {len(listing_ids)} listings')
+
+    def progress(self, message):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:7.1f}s] {message}')
+
+
+def read_chunks(path, fmt, chunk_size, offset):
+    """
+    Yields the rows of the file from `offset` on in lists of chunk_size
+    (row, byte offset of the row) records, each with the byte offset the
+    next chunk starts at
+    """
+    with open(path, 'rb') as file:
+        rows = read_rows(file, fmt, offset)
+        while chunk := list(islice(rows, chunk_size)):
+            yield [(record, position) for record, position, _ in chunk], chunk[-1][2]
+
+
+def read_rows(file, fmt, offset):
+    """
+    Yields (row, offset of the row, offset after it) from `offset` on. CSV
+    rows can span lines (quoted newlines); the csv reader pulls only the
+    lines of one row at a time, so file.tell() stays on row boundaries.
+    """
+    if fmt == 'csv':
+        header = next(csv.reader([file.readline().decode('utf-8-sig')]))
+        offset = max(offset, file.tell())
+    file.seek(offset)
+    lines = (
+        line.decode('utf-8', errors='replace') for line in iter(file.readline, b'')
+    )
+    if fmt == 'csv':
+        records = csv.DictReader(lines, fieldnames=header)
+    else:
+        records = (parse_json(line) for line in lines if line.strip())
+    while True:
+        position = file.tell()
+        try:
+            record = next(records)
+        except StopIteration:
+            return
+        yield record, position, file.tell()
+
+
+def parse_json(text):
+    try:
+        record = json.loads(text)
+    except ValueError:
+        return text
+    return record if isinstance(record, dict) else text
+
+
+def parse_record(record, default_created_at):
+    if not isinstance(record, dict):
+        raise Rejected('Not a JSON object')
+    try:
+        listing = int(record.get('listing'))
+    except (TypeError, ValueError):
+        raise Rejected('Invalid listing id')
+
+    user = username = None
+    if record.get('user') not in (None, ''):
+        try:
+            user = int(record['user'])
+        except (TypeError, ValueError):
+            raise Rejected('Invalid user id')
+    elif record.get('username'):
+        username = str(record['username'])
+    else:
+        raise Rejected('Missing user or username')
+
+    try:
+        amount = Decimal(str(record.get('amount')))
+    except InvalidOperation:
+        raise Rejected('Invalid amount')
+    if not amount.is_finite() or amount.as_tuple().exponent < -2 or not 0 < amount <= MAX_AMOUNT:
+        raise Rejected('Invalid amount')
+
+    created_at = record.get('created_at')
+    if created_at in (None, ''):
+        created_at = default_created_at
+    else:
+        try:
+            created_at = parse_datetime(str(created_at))
+        except ValueError:
+            created_at = None
+        if created_at is None:
+            raise Rejected('Invalid created_at')
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+
+    return {
+        'listing': listing, 'user': user, 'username': username,
+        'amount': amount, 'created_at': created_at,
+    }
+
+
+def insert_bids(bids):
+    """
+    Inserts (listing, user, amount, created_at) bids with one executemany,
+    without the per-object work and the small batches of bulk_create
+    """
+    if not bids:
+        return
+    connection = connections[router.db_for_write(Bid)]
+    fields = [Bid._meta.get_field(name) for name in ('listing', 'user', 'bid', 'created_at')]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {connection.ops.quote_name(Bid._meta.db_table)} ({columns}) '
+            f'VALUES ({", ".join(["%s"] * len(fields))})',
+            [
+                [field.get_db_prep_save(value, connection) for field, value in zip(fields, bid)]
+                for bid in bids
+            ]
+        )
+
+
+def skip_existing(bids):
+    """The bids of a chunk that are not already in the database"""
+    if not bids:
+        return bids
+    times = [bid[3] for bid in bids]
+    existing = set(
+        Bid.objects.filter(
+            listing_id__in={bid[0] for bid in bids},
+            created_at__gte=min(times),
+            created_at__lte=max(times),
+        ).values_list('listing_id', 'user_id', 'bid', 'created_at')
+    )
+    return [bid for bid in bids if bid not in existing]
+
+
+def read_checkpoint(path):
+    """
+    The progress recorded by earlier runs: a first JSON line with the
+    import's start time, then one per committed chunk with the offset after
+    it and the listings it touched. A last line cut short by a crash is
+    dropped from the file.
+    """
+    state = {
+        'offset': 0, 'imported': 0, 'rejected': 0, 'listings': set(), 'started_at': None,
+    }
+    if not os.path.exists(path):
+        return state
+    valid = 0
+    with open(path, 'rb') as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b'\n'):
+                break
+            valid += len(line)
+            state.update(
+                offset=entry['offset'],
+                imported=entry['imported'],
+                rejected=entry['rejected'],
+                started_at=parse_datetime(entry['started_at']),
+            )
+            state['listings'].update(entry['listings'])
+    os.truncate(path, valid)
+    return state
+
+
+def checkpoint_entry(state, listings):
+    return {
+        'offset': state['offset'],
+        'imported': state['imported'],
+        'rejected': state['rejected'],
+        'listings': sorted(listings),
+        'started_at': state['started_at'].isoformat(),
+    }
+
+
+def write_checkpoint(journal, entry):
+    journal.write(json.dumps(entry) + '\n')
+    journal.flush()
+    os.fsync(journal.fileno())
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarking import summarize
+from auctions.events import InProcessBroker, listing_channel
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the listing event fan-out: many concurrent subscribers '
+        'on one listing, with bids published from another thread like the '
+        'bid path does'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=5000)
+        parser.add_argument('--events', type=int, default=50)
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=20.0,
+            help='Events published per second'
+        )
+        parser.add_argument(
+            '--trace-memory',
+            action='store_true',
+            help='Report peak memory (tracemalloc slows delivery down)'
+        )
+
+    def handle(self, *args, **options):
+        if options['trace_memory']:
+            tracemalloc.start()
+        result = asyncio.run(self.run(
+            options['subscribers'], options['events'], options['rate']
+        ))
+        if options['trace_memory']:
+            result['peak_memory_mb'] = round(
+                tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2
+            )
+            tracemalloc.stop()
+        self.stdout.write(json.dumps(result, indent=2))
+
+    async def run(self, subscriber_count, event_count, rate):
+        broker = InProcessBroker()
+        channel = listing_channel(1)
+        latencies = []
+
+        async def subscriber():
+            subscription = broker.subscribe(channel)
+            try:
+                for _ in range(event_count):
+                    event = await subscription.get()
+                    latencies.append(time.perf_counter() - event['sent'])
+            finally:
+                subscription.close()
+
+        tasks = [asyncio.create_task(subscriber()) for _ in range(subscriber_count)]
+        await asyncio.sleep(0)
+
+        def publisher():
+            for i in range(event_count):
+                broker.publish(channel, {
+                    'type': 'bid',
+                    'listing': 1,
+                    'price': str(10 + i),
+                    'sent': time.perf_counter(),
+                })
+                time.sleep(1 / rate)
+
+        started = time.perf_counter()
+        thread = threading.Thread(target=publisher)
+        thread.start()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        thread.join()
+
+        return {
+            'subscribers': subscriber_count,
+            'events': event_count,
+            'deliveries': len(latencies),
+            'deliveries_per_second': round(len(latencies) / elapsed),
+            'delivery_latency': summarize(latencies),
+        }
@@ -1,17 +1,71 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
+from itertools import islice
+import random
+import time
 from auctions.models import Category, Listing, Bid, Comment
 
 User = get_user_model()
 
 
+CATEGORY_NAMES = [
+    'Electronics',
+    'Fashion',
+    'Home & Garden',
+    'Sports',
+    'Books',
+    'Toys',
+    'Automotive',
+    'Art & Collectibles'
+]
+
+ADJECTIVES = [
+    'Vintage', 'Antique', 'Handmade', 'Refurbished', 'Rare', 'Signed',
+    'Limited', 'Classic', 'Modern', 'Restored'
+]
+ITEMS = [
+    'Camera', 'Guitar', 'Watch', 'Bicycle', 'Lamp', 'Chair', 'Novel',
+    'Jacket', 'Vase', 'Record', 'Laptop', 'Poster'
+]
+
+
 class Command(BaseCommand):
     help = 'Populate the database with test data for the auction site'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Generate a large synthetic dataset for load testing instead'
+        )
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--listings', type=int, default=10000)
+        parser.add_argument('--bids-per-listing', type=int, default=100)
+        parser.add_argument('--comments-per-listing', type=int, default=5)
+        parser.add_argument(
+            '--watches-per-user',
+            type=int,
+            default=20,
+            help='Watchlist entries per synthetic user'
+        )
+        parser.add_argument(
+            '--closed-fraction',
+            type=float,
+            default=0.1,
+            help='Share of synthetic listings whose auction is closed'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
     def handle(self, *args, **options):
+        if options['bulk']:
+            return self.populate_bulk(options)
+
         # Create superuser first
         self.stdout.write('Creating superuser...')
         admin_user, created = User.objects.get_or_create(
@@ -29,24 +83,7 @@ class Command(BaseCommand):
         else:
             self.stdout.write(f'Superuser already exists: {admin_user.username}')
 
-        # Create categories
-        categories_data = [
-            'Electronics',
-            'Fashion',
-            'Home & Garden',
-            'Sports',
-            'Books',
-            'Toys',
-            'Automotive',
-            'Art & Collectibles'
-        ]
-
-        categories = {}
-        for cat_name in categories_data:
-            category, created = Category.objects.get_or_create(name=cat_name)
-            categories[cat_name] = category
-            if created:
-                self.stdout.write(f'Created category: {cat_name}')
+        categories = self.create_categories()
 
         # Create test users
         users_data = [
@@ -336,3 +373,165 @@ class Command(BaseCommand):
                 'with the admin account'
             )
         )
+
+    def create_categories(self):
+        categories = {}
+        for cat_name in CATEGORY_NAMES:
+            category, created = Category.objects.get_or_create(name=cat_name)
+            categories[cat_name] = category
+            if created:
+                self.stdout.write(f'Created category: {cat_name}')
+        return categories
+
+    def populate_bulk(self, options):
+        """
+        Bulk inserts synthetic users, listings, bids, comments and watchlist
+        entries in batches inside one transaction. The same --seed always
+        generates the same data.
+        """
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        self.started = time.perf_counter()
+        now = timezone.now()
+
+        with transaction.atomic():
+            categories = list(self.create_categories().values())
+
+            # Hashing is deliberately slow; every synthetic user shares one
+            # precomputed hash of the usual test password.
+            password = make_password('testpass123')
+            first = User.objects.count()
+            users = User.objects.bulk_create(
+                (
+                    User(
+                        username=f'user{first + n}',
+                        email=f'user{first + n}@example.com',
+                        password=password
+                    )
+                    for n in range(options['users'])
+                ),
+                batch_size=batch_size
+            )
+            user_ids = [user.pk for user in users]
+            self.progress(f'{len(user_ids)} users')
+
+            listings = []
+            for chunk in batched(range(options['listings']), batch_size):
+                listings += Listing.objects.bulk_create(
+                    self.make_listing(rng, n, user_ids, categories, now)
+                    for n in chunk
+                )
+            listing_ids = [listing.pk for listing in listings]
+            self.progress(f'{len(listings)} listings')
+
+            # Rows are generated one batch at a time so memory stays flat
+            # however many there are in total.
+            bids = self.insert_rows(
+                Bid, batched_rows(
+                    listings, options['bids_per_listing'], batch_size,
+                    lambda listing: [
+                        Bid(
+                            bid=amount,
+                            user_id=rng.choice(user_ids),
+                            listing_id=listing.pk,
+                            created_at=created_at
+                        )
+                        for amount, created_at in bid_ladder(
+                            rng, listing, options['bids_per_listing'], now
+                        )
+                    ]
+                )
+            )
+            self.progress(f'{bids} bids')
+
+            comments = self.insert_rows(
+                Comment, batched_rows(
+                    listing_ids, options['comments_per_listing'], batch_size,
+                    lambda pk: [
+                        Comment(
+                            comment=f'Comment {n} on listing {pk}',
+                            listing_id=pk,
+                            user_id=rng.choice(user_ids)
+                        )
+                        for n in range(options['comments_per_listing'])
+                    ]
+                )
+            )
+            self.progress(f'{comments} comments')
+
+            Watch = Listing.watchlist.through
+            watches = min(options['watches_per_user'], len(listing_ids))
+            entries = self.insert_rows(
+                Watch, batched_rows(
+                    user_ids, watches, batch_size,
+                    lambda user_id: [
+                        Watch(listing_id=pk, user_id=user_id)
+                        for pk in rng.sample(listing_ids, watches)
+                    ]
+                )
+            )
+            self.progress(f'{entries} watchlist entries')
+
+            # Point every listing at its highest bid, then close a share of
+            # them so each winner is the bidder of that bid.
+            for chunk in batched(listing_ids, batch_size):
+                Listing.objects.filter(pk__in=chunk).refresh_bid_aggregates()
+            closed = rng.sample(
+                listing_ids, int(len(listing_ids) * options['closed_fraction'])
+            )
+            for chunk in batched(closed, batch_size):
+                Listing.objects.filter(pk__in=chunk).close()
+            self.progress(f'Bid aggregates refreshed, {len(closed)} auctions closed')
+
+        self.stdout.write(self.style.SUCCESS(
+            'Bulk test data populated successfully! Synthetic users log in '
+            'with password: testpass123'
+        ))
+
+    def make_listing(self, rng, n, user_ids, categories, now):
+        starting_price = Decimal(rng.randint(5, 2000))
+        return Listing(
+            created_at=now - timedelta(seconds=rng.randint(3600, 30 * 86400)),
+            title=f'{rng.choice(ADJECTIVES)} {rng.choice(ITEMS)} {n}',
+            description=f'Synthetic listing {n} generated for load testing.',
+            starting_price=starting_price,
+            current_price=starting_price,
+            category=categories[n % len(categories)],
+            owner_id=rng.choice(user_ids)
+        )
+
+    def insert_rows(self, model, batches):
+        count = 0
+        for rows in batches:
+            model.objects.bulk_create(rows)
+            count += len(rows)
+        return count
+
+    def progress(self, message):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:7.1f}s] {message}')
+
+
+def batched(items, size):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def batched_rows(parents, rows_per_parent, batch_size, make_rows):
+    """Yields lists of about batch_size rows built by make_rows(parent)"""
+    for chunk in batched(parents, max(1, batch_size // max(1, rows_per_parent))):
+        yield [row for parent in chunk for row in make_rows(parent)]
+
+
+def bid_ladder(rng, listing, count, now):
+    """
+    count strictly increasing (amount, time) bids above the listing's
+    starting price, spread between its creation and now
+    """
+    span = (now - listing.created_at).total_seconds()
+    offsets = sorted(rng.uniform(0, span) for _ in range(count))
+    amount = listing.starting_price
+    for offset in offsets:
+        amount += Decimal(rng.randint(1, 2500)) / 100
+        yield amount, listing.created_at + timedelta(seconds=offset)
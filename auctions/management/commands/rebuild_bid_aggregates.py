@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from auctions.models import Bid, Listing
+
+
+def mismatched_listings():
+    """
+    Listings whose stored bid aggregates (price, current_price, bid_count
+    and last_bid_at) disagree with their Bid rows
+    """
+    bids = Bid.objects.filter(listing=OuterRef("pk")).order_by()
+    highest = bids.order_by("-bid", "id")
+    return Listing.objects.annotate(
+        expected_count=Coalesce(
+            Subquery(bids.values("listing").annotate(count=Count("pk")).values("count")),
+            0
+        ),
+        expected_price=Coalesce(Subquery(highest.values("pk")[:1]), 0),
+        expected_current_price=Coalesce(
+            Subquery(highest.values("bid")[:1]), F("starting_price")
+        ),
+        expected_last_bid_at=Subquery(
+            bids.order_by("-created_at").values("created_at")[:1]
+        ),
+    ).filter(
+        ~Q(bid_count=F("expected_count"))
+        | ~Q(current_price=F("expected_current_price"))
+        | ~Q(expected_price=Coalesce(F("price"), 0))
+        # last_bid_at is nullable, and SQL inequality never matches NULLs
+        | Q(last_bid_at__isnull=True, expected_last_bid_at__isnull=False)
+        | Q(last_bid_at__isnull=False, expected_last_bid_at__isnull=True)
+        | Q(last_bid_at__lt=F("expected_last_bid_at"))
+        | Q(last_bid_at__gt=F("expected_last_bid_at"))
+    )
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized bid aggregates on Listing from the Bid rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only check that the stored price, current price, bid count '
+                 'and last bid time match the Bid rows'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Listings updated per transaction'
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            bounds = Listing.objects.aggregate(low=Min('pk'), high=Max('pk'))
+            low, high = bounds['low'], bounds['high']
+            updated = 0
+            if low is not None:
+                for start in range(low, high + 1, options['batch_size']):
+                    with transaction.atomic():
+                        updated += Listing.objects.filter(
+                            pk__gte=start, pk__lt=start + options['batch_size']
+                        ).refresh_bid_aggregates()
+            self.stdout.write(f'Rebuilt bid aggregates for {updated} listings')
+
+        mismatched = list(mismatched_listings().values_list('pk', flat=True)[:20])
+        if mismatched:
+            raise CommandError(
+                'Bid aggregates do not match the Bid rows for listings: '
+                + ', '.join(str(pk) for pk in mismatched)
+            )
+        self.stdout.write(self.style.SUCCESS('All bid aggregates match the Bid rows'))
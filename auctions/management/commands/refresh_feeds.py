@@ -0,0 +1,65 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from auctions.feeds import TRENDING_HOURS, TRENDING_SIZE, refresh_trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Long-running worker that recounts the trending scores of active '
+        'listings and keeps the top ones in ListingScore. New bids and '
+        'watchers bump the stored scores in between.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=TRENDING_HOURS,
+            help='Bids older than this no longer count'
+        )
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=TRENDING_SIZE,
+            help='Listings kept in the trending table'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60.0,
+            help='Seconds between refreshes'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Refresh once, then exit'
+        )
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while self.running:
+            started = time.perf_counter()
+            try:
+                ranked = refresh_trending(options['hours'], options['size'])
+            except OperationalError as e:
+                # Another writer held the lock; retried on the next round
+                self.stderr.write(f'Refresh failed, retrying: {e}')
+            else:
+                self.stdout.write(
+                    f'Ranked {ranked} trending listings '
+                    f'in {time.perf_counter() - started:.2f}s'
+                )
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        connection.close()
+
+    def stop(self, signum, frame):
+        self.running = False
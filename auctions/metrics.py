@@ -0,0 +1,167 @@
+import math
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Upper bounds, in seconds, suited to request and query latencies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """A process-local monotonically increasing counter with labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        return self._values[tuple(labels[name] for name in self.labelnames)]
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """A process-local histogram with cumulative buckets and labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per bucket counts, sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(tuple(labels[name] for name in self.labelnames))
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            values = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            }
+        for key, (counts, total, count) in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": f"{bound:g}"}, cumulative
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+REGISTRY = []
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def format_value(value):
+    """Sample values in full: ints as they are, floats round-tripped"""
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def render_metrics():
+    """Renders every registered metric in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+card_cache_requests = Counter(
+    "auctions_card_cache_requests_total",
+    "Listing card fragment cache lookups",
+    ["result"]
+)
+
+rate_limited_requests = Counter(
+    "auctions_rate_limited_requests_total",
+    "Requests rejected by a rate limit, by scope and key",
+    ["scope", "key"]
+)
+
+coalesced_requests = Counter(
+    "auctions_coalesced_requests_total",
+    "Duplicate submissions answered with the result of an identical one in flight"
+)
+
+request_duration = Histogram(
+    "auctions_request_duration_seconds",
+    "Total time spent handling a request, by view",
+    ["view"]
+)
+
+request_db_duration = Histogram(
+    "auctions_request_db_duration_seconds",
+    "Time spent in database queries per request, by view",
+    ["view"]
+)
+
+request_template_duration = Histogram(
+    "auctions_request_template_duration_seconds",
+    "Time spent rendering templates per request, by view",
+    ["view"]
+)
+
+request_queries = Histogram(
+    "auctions_request_queries",
+    "Database queries run per request, by view",
+    ["view"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+
+query_budget_exceeded = Counter(
+    "auctions_query_budget_exceeded_total",
+    "Requests that ran more queries than AUCTIONS_QUERY_BUDGET",
+    ["view"]
+)
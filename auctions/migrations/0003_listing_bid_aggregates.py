@@ -0,0 +1,49 @@
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def populate_bid_aggregates(apps, schema_editor):
+    Bid = apps.get_model("auctions", "Bid")
+    Listing = apps.get_model("auctions", "Listing")
+    bids = Bid.objects.filter(listing=OuterRef("pk")).order_by()
+    Listing.objects.update(
+        bid_count=Coalesce(
+            Subquery(bids.values("listing").annotate(count=Count("pk")).values("count")),
+            0
+        ),
+        current_price=Coalesce(
+            Subquery(bids.order_by("-bid", "id").values("bid")[:1]),
+            F("starting_price")
+        ),
+    )
+    # Bids carry no timestamp, so the migration time is the best estimate
+    Listing.objects.filter(bid_count__gt=0).update(last_bid_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0002_listing_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='current_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='last_bid_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_bid_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0006_listing_ends_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['listing', '-created_at', '-id'], name='comment_listing_thread_idx'),
+        ),
+    ]
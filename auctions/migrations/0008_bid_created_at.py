@@ -0,0 +1,52 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:38
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_bid_times(apps, schema_editor):
+    """
+    Existing bids get their listing's last bid time (or creation time),
+    the latest moment they can have been placed, which keeps last_bid_at
+    equal to the newest bid's created_at.
+    """
+    Bid = apps.get_model("auctions", "Bid")
+    Listing = apps.get_model("auctions", "Listing")
+    listing = Listing.objects.filter(pk=OuterRef("listing"))
+    Bid.objects.update(
+        created_at=Subquery(
+            listing.annotate(
+                bid_time=Coalesce(F("last_bid_at"), F("created_at"))
+            ).values("bid_time")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0007_comment_thread_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bid',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_bid_times, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['listing', '-bid'], name='bid_listing_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['listing', '-created_at', '-id'], name='bid_listing_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='bid_user_history_idx'),
+        ),
+    ]
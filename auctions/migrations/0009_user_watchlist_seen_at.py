@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0008_bid_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='watchlist_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
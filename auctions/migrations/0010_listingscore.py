@@ -0,0 +1,28 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_user_watchlist_seen_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingScore',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending_score', serialize=False, to='auctions.listing')),
+                ('recent_bids', models.IntegerField(default=0)),
+                ('watchers', models.IntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='listing_score_rank_idx')],
+            },
+        ),
+    ]
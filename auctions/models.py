@@ -1,10 +1,24 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    BooleanField, Case, Count, Exists, ExpressionWrapper, F, OuterRef, Q,
+    Subquery, Value, When
+)
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
 class User(AbstractUser):
-    pass
+    # When the user last opened their watchlist, for its outbid digest
+    watchlist_seen_at = models.DateTimeField(blank=True, null=True)
+
+    def mark_watchlist_seen(self):
+        self.watchlist_seen_at = timezone.now()
+        User.objects.filter(pk=self.pk).update(watchlist_seen_at=self.watchlist_seen_at)
+
+    async def amark_watchlist_seen(self):
+        self.watchlist_seen_at = timezone.now()
+        await User.objects.filter(pk=self.pk).aupdate(watchlist_seen_at=self.watchlist_seen_at)
 
 
 class Category(models.Model):
@@ -26,30 +40,185 @@ class Bid(models.Model):
         on_delete=models.CASCADE,
         related_name="listing_bids"
     )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Highest bids of a listing
+            models.Index(fields=["listing", "-bid"], name="bid_listing_amount_idx"),
+            # Keyset pagination and price series of a listing's bid history
+            models.Index(
+                fields=["listing", "-created_at", "-id"],
+                name="bid_listing_history_idx"
+            ),
+            # A user's own bid history
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="bid_user_history_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} bid {self.bid} on {self.listing}"
 
     def delete(self, *args, **kwargs):
-        listing = self.listing
-        super().delete(*args, **kwargs)
-        # Obtener la Bid más alta restante para la Listing
-        highest_bid = listing.listing_bids.order_by('-bid').first()
-        # Actualizar el precio de la Listing
-        listing.price = highest_bid
-        listing.save()
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            # Recompute the remaining highest bid and count for the Listing
+            Listing.objects.filter(pk=self.listing_id).refresh_bid_aggregates()
+        return result
+
+    def save(self, *args, sync_listing=True, **kwargs):
+        # sync_listing=False is for callers that already folded this bid
+        # into the listing's aggregates, like auctions.bidding.place_bid
+        if not sync_listing:
+            return super().save(*args, **kwargs)
 
-    def save(self, *args, **kwargs):
         # Only validate for new bids (not updates), and only for active listings
-        if self.pk is None and self.listing.active:  # New bid on active listing
+        adding = self.pk is None
+        if adding and self.listing.active:  # New bid on active listing
             if self.bid <= self.listing.current_price:
                 raise ValueError(f"Bid must be higher than current price of {self.listing.current_price}")
-        
-        super().save(*args, **kwargs)
-        # Update the listing's price to point to the highest bid
-        highest_bid = self.listing.listing_bids.order_by('-bid').first()
-        self.listing.price = highest_bid
-        self.listing.save()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            listings = Listing.objects.filter(pk=self.listing_id)
+            if adding:
+                listings.record_bid(self)
+            else:
+                listings.refresh_bid_aggregates()
+
+
+def price_bidder():
+    """The user who placed the listing's price bid, for use in an UPDATE"""
+    return Subquery(Bid.objects.filter(pk=OuterRef("price")).values("user")[:1])
+
+
+class ListingQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(active=True)
+
+    def expired(self, now=None):
+        return self.filter(active=True, ends_at__lte=now or timezone.now())
+
+    def close(self):
+        """
+        Closes every still active listing in the queryset with one UPDATE,
+        making the bidder of each listing's price bid its winner.
+        """
+        return self.filter(active=True).update(
+            active=False,
+            winner=price_bidder(),
+            version=F("version") + 1,
+        )
+
+    def refresh_winners(self):
+        """
+        Makes the bidder of each closed listing's price bid its winner again,
+        for closed listings whose bids were rewritten
+        """
+        return self.filter(active=False).update(
+            winner=price_bidder(),
+            version=F("version") + 1,
+        )
+
+    def watched_ids(self, user, listings):
+        """
+        The ids among `listings`, and in this queryset, that `user` watches,
+        in one query through the watchlist table's (listing, user) index.
+        """
+        if not user.is_authenticated:
+            return set()
+        return set(self._watched_by(user, listings))
+
+    async def awatched_ids(self, user, listings):
+        if not user.is_authenticated:
+            return set()
+        return {listing_id async for listing_id in self._watched_by(user, listings)}
+
+    def _watched_by(self, user, listings):
+        return self.filter(
+            pk__in=[listing.pk for listing in listings], watchlist=user
+        ).order_by().values_list("pk", flat=True)
+
+    def with_watch_digest(self, user):
+        """
+        Annotates what changed since `user` last saw their watchlist:
+        `new_bids`, the number of bids placed since, and `outbid`, whether
+        someone else has overtaken the user's bid since. Both are computed
+        by the listing query itself, with index lookups per row.
+        """
+        seen_at = user.watchlist_seen_at
+        if seen_at is None:
+            return self.annotate(new_bids=Value(0), outbid=Value(False))
+        bids = Bid.objects.filter(listing=OuterRef("pk")).order_by()
+        new_bids = bids.filter(created_at__gt=seen_at).values("listing").annotate(
+            count=Count("pk")
+        ).values("count")
+        return self.annotate(
+            new_bids=Coalesce(Subquery(new_bids), 0),
+            outbid=ExpressionWrapper(
+                Q(last_bid_at__gt=seen_at)
+                & Exists(bids.filter(user=user))
+                & ~Q(price__user=user),
+                output_field=BooleanField()
+            ),
+        )
+
+    def feed(self):
+        """Listings with everything a card renders fetched in one query"""
+        return self.select_related("category")
+
+    def record_bid(self, bid):
+        """
+        Folds a newly inserted bid into the denormalized aggregates with a
+        single UPDATE. Every CASE reads the row as it is at write time, so
+        concurrent bids can never leave `price` pointing at a lower bid.
+        """
+        outbids = Q(price__isnull=True) | Q(current_price__lt=bid.bid)
+        return self.update(
+            version=F("version") + 1,
+            bid_count=F("bid_count") + 1,
+            last_bid_at=Case(
+                When(
+                    Q(last_bid_at__isnull=True) | Q(last_bid_at__lt=bid.created_at),
+                    then=Value(bid.created_at)
+                ),
+                default=F("last_bid_at"),
+                output_field=models.DateTimeField()
+            ),
+            price=Case(
+                When(outbids, then=Value(bid.pk)),
+                default=F("price"),
+                output_field=models.BigIntegerField()
+            ),
+            current_price=Case(
+                When(outbids, then=Value(bid.bid)),
+                default=F("current_price"),
+                output_field=models.DecimalField()
+            ),
+        )
+
+    def refresh_bid_aggregates(self):
+        """Recomputes the bid aggregates from the Bid rows, set-based"""
+        bids = Bid.objects.filter(listing=OuterRef("pk")).order_by()
+        highest = bids.order_by("-bid", "id")
+        return self.update(
+            version=F("version") + 1,
+            bid_count=Coalesce(
+                Subquery(
+                    bids.values("listing").annotate(count=Count("pk")).values("count")
+                ),
+                0
+            ),
+            price=Subquery(highest.values("pk")[:1]),
+            current_price=Coalesce(
+                Subquery(highest.values("bid")[:1]), F("starting_price")
+            ),
+            last_bid_at=Subquery(
+                bids.order_by("-created_at").values("created_at")[:1]
+            ),
+        )
 
 
 class Listing(models.Model):
@@ -89,14 +258,65 @@ class Listing(models.Model):
         related_name="winner_listings"
     )
     created_at = models.DateTimeField(default=timezone.now)
+    ends_at = models.DateTimeField(blank=True, null=True)
+    # Denormalized from the Listing's bids by the bid write path
+    current_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        editable=False
+    )
+    bid_count = models.PositiveIntegerField(default=0, editable=False)
+    last_bid_at = models.DateTimeField(blank=True, null=True, editable=False)
+    # Bumped whenever anything a listing card shows changes
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = ListingQuerySet.as_manager()
+
+    BID_AGGREGATE_FIELDS = ("price", "current_price", "bid_count", "last_bid_at")
+    VERSIONED_FIELDS = BID_AGGREGATE_FIELDS + ("version",)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the active listings and category pages
+            models.Index(
+                fields=["active", "-created_at", "-id"],
+                name="listing_active_feed_idx"
+            ),
+            models.Index(
+                fields=["category", "active", "-created_at", "-id"],
+                name="listing_category_feed_idx"
+            ),
+            # Each expiry sweep only visits the listings due to close
+            models.Index(
+                fields=["active", "ends_at"],
+                name="listing_expiry_idx"
+            ),
+        ]
+
+    def is_watched_by(self, user):
+        """
+        Whether `user` watches this listing: one lookup on the unique
+        (listing, user) index, however many watchers the listing has.
+        """
+        if not user.is_authenticated:
+            return False
+        return self._watchers(user).exists()
+
+    async def ais_watched_by(self, user):
+        if not user.is_authenticated:
+            return False
+        return await self._watchers(user).aexists()
+
+    def _watchers(self, user):
+        return Listing.watchlist.through.objects.filter(
+            listing_id=self.pk, user_id=user.pk
+        )
 
     @property
-    def current_price(self):
-        """Returns the current price - either highest bid amount or starting price"""
-        if self.price:  # If there are bids
-            return self.price.bid
-        return self.starting_price
-    
+    def is_open(self):
+        """Active and before its end time, even if not yet swept by expire_auctions"""
+        return self.active and (self.ends_at is None or self.ends_at > timezone.now())
+
     @property
     def highest_bid(self):
         """Returns the highest bid object or None"""
@@ -105,6 +325,30 @@ class Listing(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            if self.price_id is None:
+                self.current_price = self.starting_price
+            return super().save(*args, **kwargs)
+        if kwargs.get("update_fields") is None:
+            # The bid aggregates are only written by the bid path; saving
+            # possibly stale in-memory copies back would undo newer bids.
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.VERSIONED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        # Without bids the current price follows the starting price
+        Listing.objects.filter(pk=self.pk).update(
+            version=F("version") + 1,
+            current_price=Case(
+                When(price__isnull=True, then=F("starting_price")),
+                default=F("current_price")
+            ),
+        )
+        self.refresh_from_db(fields=("version", "current_price"))
+
 
 class Comment(models.Model):
     comment = models.CharField(max_length=256)
@@ -120,5 +364,40 @@ class Comment(models.Model):
     )
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a listing's comment thread
+            models.Index(
+                fields=["listing", "-created_at", "-id"],
+                name="comment_listing_thread_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user} commented on {self.listing}"
+
+
+class ListingScore(models.Model):
+    """
+    The trending score of one of the top listings, materialized by the
+    refresh_feeds command and bumped by new bids and watchers in between
+    (see auctions.feeds)
+    """
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending_score"
+    )
+    recent_bids = models.IntegerField(default=0)
+    watchers = models.IntegerField(default=0)
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score"], name="listing_score_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} scores {self.score}"
@@ -0,0 +1,77 @@
+import base64
+import binascii
+from datetime import datetime
+
+PAGE_SIZE = 24
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """A slice of a queryset ordered newest first on (created_at, id)"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def keyset_slice(queryset, cursor=None, page_size=PAGE_SIZE):
+    """
+    Keyset pagination: every page is an index range scan starting right
+    after the last row of the previous one, so deep pages cost the same
+    as the first instead of growing like OFFSET does. Returns the sliced
+    queryset, one row longer than the page to detect a next page.
+    """
+    queryset = queryset.order_by("-created_at", "-id")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # The leading range on created_at lets the database seek into the
+        # index; the exclude only breaks ties between equal timestamps.
+        queryset = queryset.filter(created_at__lte=created_at).exclude(
+            created_at=created_at, id__gte=pk
+        )
+    return queryset[:page_size + 1]
+
+
+def make_page(items, page_size=PAGE_SIZE):
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1])
+    return KeysetPage(items, next_cursor)
+
+
+def paginate(queryset, cursor=None, page_size=PAGE_SIZE):
+    items = list(keyset_slice(queryset, cursor, page_size))
+    return make_page(items, page_size)
+
+
+async def apaginate(queryset, cursor=None, page_size=PAGE_SIZE):
+    items = [item async for item in keyset_slice(queryset, cursor, page_size)]
+    return make_page(items, page_size)
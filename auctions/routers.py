@@ -0,0 +1,100 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary. Reads go to the replica only inside views
+decorated with @replica_reads, i.e. the read-only pages, and only for
+clients that have not written anything in the last
+AUCTIONS_REPLICA_STICKY_SECONDS: PrimaryStickinessMiddleware marks those
+with a cookie so they read their own writes from the primary.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = "replica"
+STICKY_COOKIE = "auctions_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+replica_enabled = ContextVar("replica_enabled", default=False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if replica_enabled.get() and REPLICA_ALIAS in settings.DATABASES:
+            return REPLICA_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema through replication
+        return db != REPLICA_ALIAS
+
+
+def is_sticky(request):
+    return STICKY_COOKIE in request.COOKIES
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    token = replica_enabled.set(enabled)
+    try:
+        yield
+    finally:
+        replica_enabled.reset(token)
+
+
+def replica_reads(view):
+    """Serves a read-only view from the replica, unless the client is sticky"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with read_from_replica(not is_sticky(request)):
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with read_from_replica(not is_sticky(request)):
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryStickinessMiddleware:
+    """Pins a client to the primary for a while after each write request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.mark(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.mark(request, await self.get_response(request))
+
+    def mark(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE,
+                "1",
+                max_age=settings.AUCTIONS_REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax"
+            )
+        return response
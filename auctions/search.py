@@ -0,0 +1,101 @@
+import re
+
+from django.db import NotSupportedError, connection
+
+from .models import Listing
+
+PAGE_SIZE = 24
+# Ranked results are paged by number; past this depth users refine instead
+MAX_PAGE = 40
+MAX_TERMS = 8
+
+
+class SearchPage:
+    def __init__(self, items, number, has_next):
+        self.items = items
+        self.number = number
+        self.has_next = has_next
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def search_terms(query):
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def _sqlite_query(terms, filters, params):
+    # Every term is quoted (no FTS syntax injection) and prefix matched
+    match = " ".join('"{}"*'.format(term) for term in terms)
+    sql = (
+        "SELECT l.id FROM auctions_listing_fts"
+        " JOIN auctions_listing l ON l.id = auctions_listing_fts.rowid"
+        " WHERE auctions_listing_fts MATCH %s{}"
+        # Title hits weigh ten times description hits
+        " ORDER BY bm25(auctions_listing_fts, 10.0, 1.0), l.id"
+        " LIMIT %s OFFSET %s"
+    ).format(filters)
+    return sql, [match] + params
+
+
+def _postgresql_query(terms, filters, params):
+    match = " & ".join("{}:*".format(term) for term in terms)
+    document = "to_tsvector('english', l.title || ' ' || l.description)"
+    sql = (
+        "SELECT l.id FROM auctions_listing l"
+        " WHERE {document} @@ to_tsquery('english', %s){filters}"
+        " ORDER BY ts_rank({document}, to_tsquery('english', %s)) DESC, l.id"
+        " LIMIT %s OFFSET %s"
+    ).format(document=document, filters=filters)
+    return sql, [match] + params[:-2] + [match] + params[-2:]
+
+
+QUERY_BUILDERS = {
+    "sqlite": _sqlite_query,
+    "postgresql": _postgresql_query,
+}
+
+
+def search_listings(query, category=None, active=True, page=1, page_size=PAGE_SIZE):
+    """
+    Ranked full-text search over listing titles and descriptions, served
+    from the inverted index created by migration 0005 (FTS5 on SQLite, a
+    GIN tsvector index on PostgreSQL). Each term is prefix matched and all
+    terms must match. `active=None` searches open and closed listings.
+    """
+    terms = search_terms(query)
+    page = max(1, min(page, MAX_PAGE))
+    if not terms:
+        return SearchPage([], page, False)
+    try:
+        build = QUERY_BUILDERS[connection.vendor]
+    except KeyError:
+        raise NotSupportedError(
+            f"Listing search is not available on {connection.vendor}"
+        )
+
+    filters = ""
+    params = []
+    if active is not None:
+        filters += " AND l.active = %s"
+        params.append(active)
+    if category is not None:
+        filters += " AND l.category_id = %s"
+        params.append(category.pk)
+    params += [page_size + 1, (page - 1) * page_size]
+    sql, params = build(terms, filters, params)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [row[0] for row in cursor.fetchall()]
+    has_next = len(ids) > page_size and page < MAX_PAGE
+    ids = ids[:page_size]
+    listings = Listing.objects.feed().in_bulk(ids)
+    return SearchPage([listings[pk] for pk in ids if pk in listings], page, has_next)
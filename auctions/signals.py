@@ -0,0 +1,36 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .feeds import bump_watcher_scores
+from .instrumentation import install_query_recorder
+from .models import Category, Listing
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categories(sender, **kwargs):
+    bump_version("categories")
+
+
+@receiver(m2m_changed, sender=Listing.watchlist.through)
+def count_watchers(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove") and pk_set:
+        sign = 1 if action == "post_add" else -1
+        if reverse:
+            # A user's side: pk_set holds listings, one watcher each
+            bump_watcher_scores(pk_set, sign)
+        else:
+            bump_watcher_scores([instance.pk], sign * len(pk_set))
+    elif action == "pre_clear":
+        # pk_set is None for clears; runs in the clear's transaction
+        watches = sender.objects.filter(**{"user_id" if reverse else "listing_id": instance.pk})
+        if reverse:
+            bump_watcher_scores(list(watches.values_list("listing_id", flat=True)), -1)
+        else:
+            bump_watcher_scores([instance.pk], -watches.count())
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    install_query_recorder(connection)
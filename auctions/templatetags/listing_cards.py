@@ -0,0 +1,41 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from ..cache import get_version
+from ..metrics import card_cache_requests
+
+register = template.Library()
+
+CARD_CACHE_TIMEOUT = 60 * 60
+
+
+def card_cache_key(listing, categories_version):
+    # A card only changes with its listing's version or a category rename
+    return f"listing_card:{listing.pk}:v{listing.version}:c{categories_version}"
+
+
+@register.simple_tag
+def listing_cards(listings):
+    """
+    Returns (listing, card html) pairs for a grid, serving the rendered
+    components/card.html fragments from the cache in one round trip and
+    rendering only the cards whose listing changed since they were cached.
+    """
+    listings = list(listings)
+    categories_version = get_version("categories")
+    keys = [card_cache_key(listing, categories_version) for listing in listings]
+    cached = cache.get_many(keys)
+    missing = {}
+    cards = []
+    for listing, key in zip(listings, keys):
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string("components/card.html", {"listing": listing})
+            missing[key] = card
+        cards.append((listing, card))
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+    card_cache_requests.inc(len(cached), result="hit")
+    card_cache_requests.inc(len(missing), result="miss")
+    return cards
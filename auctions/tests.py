@@ -1,3 +1,1576 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+import asyncio
+import csv
+import importlib.util
+import json
+import os
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.db.models import Max
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import admin as auctions_admin, async_views, feeds, views
+from .backends.sqlite3.base import DatabaseWrapper as TunedDatabaseWrapper
+from .benchmarking import test_database, url_conf
+from .management.commands import import_bids
+from .management.commands.rebuild_bid_aggregates import mismatched_listings
+from .bidding import BidOutcome, place_bid
+from .cache import get_categories
+from .events import InProcessBroker, format_sse, get_broker, listing_channel
+from .metrics import (
+    REGISTRY, Counter, Histogram, card_cache_requests, coalesced_requests,
+    rate_limited_requests, render_metrics, request_queries
+)
+from .feeds import refresh_trending
+from .models import User, Category, Listing, Bid, Comment, ListingScore
+from .routers import (
+    STICKY_COOKIE, PrimaryReplicaRouter, read_from_replica, replica_enabled,
+    replica_reads
+)
+from .search import search_listings
+from .throttling import local_buckets, single_flight, take_token
+
+
+def make_listing(owner, category, title="Listing", price="10.00", **kwargs):
+    return Listing.objects.create(
+        title=title,
+        description=f"Description of {title}",
+        starting_price=Decimal(price),
+        category=category,
+        owner=owner,
+        **kwargs
+    )
+
+
+class ListingFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+
+    def add_listings(self, count):
+        for i in range(count):
+            listing = make_listing(self.owner, self.category, title=f"Item {i}")
+            Bid(bid=Decimal("20.00"), user=self.bidder, listing=listing).save()
+
+    def test_feed_carries_bid_count(self):
+        self.add_listings(1)
+        listing = Listing.objects.feed().get()
+        self.assertEqual(listing.bid_count, 1)
+        self.assertEqual(listing.current_price, Decimal("20.00"))
+
+    def test_index_query_count_is_constant(self):
+        self.add_listings(2)
+        self.client.get(reverse("index"))  # Warm the category cache
+        with self.assertNumQueries(1):
+            self.client.get(reverse("index"))
+        self.add_listings(10)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("index"))
+        self.assertContains(response, "1 bid", count=12)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.books = Category.objects.create(name="Books")
+        cls.toys = Category.objects.create(name="Toys")
+        created_at = timezone.now()
+        # Shared timestamps exercise the id tie-breaker
+        for i in range(30):
+            make_listing(
+                cls.owner,
+                cls.books if i % 2 else cls.toys,
+                title=f"Item {i}",
+                created_at=created_at - timedelta(minutes=i // 3)
+            )
+
+    def collect(self, url, params):
+        seen = []
+        while True:
+            response = self.client.get(url, params)
+            page = response.context["page"]
+            seen.extend(listing.id for listing in page)
+            if not page.has_next:
+                return seen
+            params = dict(params, cursor=page.next_cursor)
+
+    def test_pages_cover_every_listing_once_in_order(self):
+        seen = self.collect(reverse("index"), {})
+        expected = list(
+            Listing.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_category_is_a_linkable_get_url(self):
+        seen = self.collect(reverse("display_category"), {"category": "Books"})
+        self.assertEqual(len(seen), 15)
+        self.assertFalse(
+            Listing.objects.filter(id__in=seen).exclude(category=self.books).exists()
+        )
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse("index"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+
+class BidAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+
+    def setUp(self):
+        self.listing = make_listing(self.owner, self.category)
+
+    def bid(self, amount):
+        bid = Bid(bid=Decimal(amount), user=self.bidder, listing=self.listing)
+        bid.save()
+        self.listing.refresh_from_db()
+        return bid
+
+    def test_new_listing_starts_at_starting_price(self):
+        self.assertEqual(self.listing.current_price, Decimal("10.00"))
+        self.assertEqual(self.listing.bid_count, 0)
+        self.assertIsNone(self.listing.last_bid_at)
+
+    def test_bids_update_aggregates(self):
+        self.bid("11.00")
+        top = self.bid("15.00")
+        self.assertEqual(self.listing.bid_count, 2)
+        self.assertEqual(self.listing.current_price, Decimal("15.00"))
+        self.assertEqual(self.listing.price, top)
+        self.assertIsNotNone(self.listing.last_bid_at)
+
+    def test_deleting_top_bid_falls_back_to_next_highest(self):
+        first = self.bid("11.00")
+        self.bid("15.00").delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 1)
+        self.assertEqual(self.listing.price, first)
+        first.delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal("10.00"))
+        self.assertIsNone(self.listing.last_bid_at)
+
+    def test_saving_stale_listing_keeps_newer_bids(self):
+        stale = Listing.objects.get(pk=self.listing.pk)
+        self.bid("12.00")
+        stale.title = "Renamed"
+        stale.save()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.title, "Renamed")
+        self.assertEqual(self.listing.current_price, Decimal("12.00"))
+        self.assertEqual(self.listing.bid_count, 1)
+
+    def test_rebuild_command_repairs_and_verifies(self):
+        self.bid("12.00")
+        Listing.objects.update(bid_count=7, current_price=Decimal("1.00"))
+        with self.assertRaises(CommandError):
+            call_command("rebuild_bid_aggregates", verify=True, stdout=StringIO())
+        call_command("rebuild_bid_aggregates", stdout=StringIO())
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 1)
+        self.assertEqual(self.listing.current_price, Decimal("12.00"))
+
+    def test_verify_catches_a_stale_last_bid_time(self):
+        bid = self.bid("12.00")
+        empty = make_listing(self.owner, self.category)
+        for listing, last_bid_at in [
+            (self.listing, bid.created_at - timedelta(hours=1)),
+            (self.listing, bid.created_at + timedelta(hours=1)),
+            (self.listing, None),
+            (empty, bid.created_at),
+        ]:
+            Listing.objects.filter(pk=listing.pk).update(last_bid_at=last_bid_at)
+            self.assertEqual(list(mismatched_listings().values_list("pk", flat=True)), [listing.pk])
+            with self.assertRaises(CommandError):
+                call_command("rebuild_bid_aggregates", verify=True, stdout=StringIO())
+            call_command("rebuild_bid_aggregates", stdout=StringIO())
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.last_bid_at, bid.created_at)
+
+
+class PlaceBidTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+
+    def setUp(self):
+        self.listing = make_listing(self.owner, self.category)
+
+    def test_accepted_bid_moves_price(self):
+        result = place_bid(self.listing.pk, self.bidder, "12.50")
+        self.assertIs(result.outcome, BidOutcome.ACCEPTED)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.price, result.bid)
+        self.assertEqual(self.listing.current_price, Decimal("12.50"))
+        self.assertEqual(self.listing.bid_count, 1)
+
+    def test_bid_not_above_current_price_is_outbid(self):
+        place_bid(self.listing.pk, self.bidder, "12.50")
+        result = place_bid(self.listing.pk, self.bidder, "12.50")
+        self.assertIs(result.outcome, BidOutcome.OUTBID)
+        self.assertEqual(result.current_price, Decimal("12.50"))
+        self.assertEqual(Bid.objects.count(), 1)
+
+    def test_closed_listing_rejects_bids(self):
+        Listing.objects.filter(pk=self.listing.pk).update(active=False)
+        result = place_bid(self.listing.pk, self.bidder, "99.00")
+        self.assertIs(result.outcome, BidOutcome.CLOSED)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_add_bid_view_reports_outcome(self):
+        self.client.force_login(self.bidder)
+        url = reverse("add_bid", args=(self.listing.pk,))
+        response = self.client.post(url, {"bid": "9"})
+        self.assertContains(response, "Bid must be greater than current price")
+        response = self.client.post(url, {"bid": "11"})
+        self.assertContains(response, "Success bid")
+        self.assertTrue(self.listing.watchlist.filter(pk=self.bidder.pk).exists())
+
+
+class ConcurrentBidStressTests(TransactionTestCase):
+    THREADS = 8
+    BIDS_PER_THREAD = 15
+
+    def test_final_price_is_max_accepted_bid(self):
+        owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        bidders = [
+            User.objects.create_user(f"bidder{i}", f"bidder{i}@example.com", "pw")
+            for i in range(self.THREADS)
+        ]
+        listing = make_listing(owner, Category.objects.create(name="Books"))
+        accepted = []
+        errors = []
+        start = threading.Barrier(self.THREADS)
+
+        def bid_loop(user, seed):
+            rng = random.Random(seed)
+            try:
+                start.wait()
+                for _ in range(self.BIDS_PER_THREAD):
+                    amount = Decimal(rng.randint(1100, 5000)) / 100
+                    result = place_bid(listing.pk, user, amount)
+                    if result.accepted:
+                        accepted.append(result.bid.bid)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=bid_loop, args=(user, i))
+            for i, user in enumerate(bidders)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        listing.refresh_from_db()
+        self.assertEqual(listing.current_price, max(accepted))
+        self.assertEqual(listing.price.bid, max(accepted))
+        self.assertEqual(listing.bid_count, len(accepted))
+        self.assertEqual(listing.listing_bids.count(), len(accepted))
+        # Each accepted bid strictly raised the price
+        self.assertEqual(len(set(accepted)), len(accepted))
+
+
+class CategoryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = Category.objects.create(name="Books")
+
+    def test_pages_reuse_cached_categories(self):
+        get_categories()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("login"))
+            self.assertEqual(list(response.context["categories"]), [self.books])
+
+    def test_category_changes_invalidate_cache(self):
+        self.assertEqual(get_categories(), [self.books])
+        toys = Category.objects.create(name="Toys")
+        self.assertEqual(get_categories(), [self.books, toys])
+        self.books.delete()
+        self.assertEqual(get_categories(), [toys])
+
+
+class CardFragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+
+    def setUp(self):
+        cache.clear()
+        self.listing = make_listing(self.owner, self.category)
+
+    def misses(self):
+        return card_cache_requests.value(result="miss")
+
+    def test_cards_are_rendered_once_per_version(self):
+        misses = self.misses()
+        self.client.get(reverse("index"))
+        self.client.get(reverse("index"))
+        self.assertEqual(self.misses(), misses + 1)
+
+    def test_bid_and_edit_invalidate_card(self):
+        self.client.get(reverse("index"))
+        place_bid(self.listing.pk, self.bidder, "42.00")
+        self.assertContains(self.client.get(reverse("index")), "42.00")
+        self.listing.title = "Renamed listing"
+        self.listing.save()
+        self.assertContains(self.client.get(reverse("index")), "Renamed listing")
+
+    def test_metrics_endpoint_exposes_counters(self):
+        self.client.get(reverse("index"))
+        response = self.client.get(reverse("metrics"))
+        self.assertContains(response, 'auctions_card_cache_requests_total{result="miss"}')
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.9")
+        self.assertEqual(response.status_code, 403)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.books = Category.objects.create(name="Books")
+        cls.toys = Category.objects.create(name="Toys")
+        cls.novel = make_listing(cls.owner, cls.books, title="Signed mystery novel")
+        cls.train = make_listing(cls.owner, cls.toys, title="Wooden train set")
+        cls.train.description = "Includes a mystery carriage"
+        cls.train.save()
+
+    def ids(self, *args, **kwargs):
+        return [listing.pk for listing in search_listings(*args, **kwargs)]
+
+    def test_prefix_match_ranks_title_hits_first(self):
+        self.assertEqual(self.ids("myst"), [self.novel.pk, self.train.pk])
+        self.assertEqual(self.ids("wood tra"), [self.train.pk])
+
+    def test_category_and_active_filters(self):
+        self.assertEqual(self.ids("mystery", category=self.toys), [self.train.pk])
+        Listing.objects.filter(pk=self.novel.pk).update(active=False)
+        self.assertEqual(self.ids("mystery"), [self.train.pk])
+        self.assertEqual(self.ids("mystery", active=None), [self.novel.pk, self.train.pk])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.train.title = "Steam engine"
+        self.train.description = "Brass"
+        self.train.save()
+        self.assertEqual(self.ids("wooden"), [])
+        self.assertEqual(self.ids("steam"), [self.train.pk])
+        self.train.delete()
+        self.assertEqual(self.ids("steam"), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.ids('novel" OR "train'), [])
+        self.assertEqual(self.ids("***"), [])
+
+    def test_search_view_paginates(self):
+        for i in range(30):
+            make_listing(self.owner, self.books, title=f"Paperback {i}")
+        response = self.client.get(reverse("search"), {"q": "paperback"})
+        self.assertTrue(response.context["page"].has_next)
+        response = self.client.get(reverse("search"), {"q": "paperback", "page": 2})
+        self.assertEqual(len(response.context["listings"]), 6)
+
+
+class AuctionExpiryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+
+    def test_worker_closes_only_expired_auctions(self):
+        now = timezone.now()
+        expired = make_listing(self.owner, self.category, title="Expired")
+        place_bid(expired.pk, self.bidder, "20.00")
+        Listing.objects.filter(pk=expired.pk).update(ends_at=now - timedelta(minutes=1))
+        unsold = make_listing(self.owner, self.category, ends_at=now - timedelta(hours=1))
+        running = make_listing(self.owner, self.category, ends_at=now + timedelta(hours=1))
+        forever = make_listing(self.owner, self.category)
+
+        out = StringIO()
+        call_command("expire_auctions", once=True, batch_size=1, stdout=out)
+        self.assertIn("Closed 1 expired auctions", out.getvalue())
+
+        expired.refresh_from_db()
+        self.assertFalse(expired.active)
+        self.assertEqual(expired.winner, self.bidder)
+        unsold.refresh_from_db()
+        self.assertFalse(unsold.active)
+        self.assertIsNone(unsold.winner)
+        self.assertEqual(
+            set(Listing.objects.active().values_list("pk", flat=True)),
+            {running.pk, forever.pk}
+        )
+
+    def test_bids_after_end_time_are_rejected(self):
+        listing = make_listing(
+            self.owner, self.category, ends_at=timezone.now() - timedelta(seconds=1)
+        )
+        result = place_bid(listing.pk, self.bidder, "50.00")
+        self.assertIs(result.outcome, BidOutcome.CLOSED)
+
+    def test_owner_closes_auction(self):
+        listing = make_listing(self.owner, self.category)
+        place_bid(listing.pk, self.bidder, "20.00")
+        self.client.force_login(self.owner)
+        response = self.client.post(reverse("close_auction", args=(listing.pk,)))
+        self.assertContains(response, "Auction closed successfully")
+        listing.refresh_from_db()
+        self.assertFalse(listing.active)
+        self.assertEqual(listing.winner, self.bidder)
+
+    def test_create_listing_rejects_impossible_end_times(self):
+        self.client.force_login(self.owner)
+        for ends_at in ("2026-02-30T10:00", "not a date", "2000-01-01T10:00"):
+            response = self.client.post(reverse("create_listing"), {
+                "title": "Timed", "description": "Ends", "image": "",
+                "category": "Books", "price": "10", "ends_at": ends_at,
+            })
+            self.assertContains(response, "The end time must be a date in the future")
+        self.assertFalse(Listing.objects.filter(title="Timed").exists())
+
+
+class ListingEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.listing = make_listing(cls.owner, Category.objects.create(name="Books"))
+
+    async def test_broker_fans_out_across_threads(self):
+        broker = InProcessBroker()
+        subscriptions = [broker.subscribe("listing:1") for _ in range(50)]
+        thread = threading.Thread(
+            target=broker.publish, args=("listing:1", {"type": "bid"})
+        )
+        thread.start()
+        thread.join()
+        events = await asyncio.gather(*(s.get() for s in subscriptions))
+        self.assertEqual(events, [{"type": "bid"}] * 50)
+        for subscription in subscriptions:
+            subscription.close()
+        self.assertEqual(broker.subscriber_count("listing:1"), 0)
+
+    def test_accepted_bids_are_published_after_commit(self):
+        published = []
+        with mock.patch.object(get_broker(), "publish", lambda *args: published.append(args)):
+            with self.captureOnCommitCallbacks(execute=True):
+                place_bid(self.listing.pk, self.bidder, "15.00")
+                self.assertEqual(published, [])
+            place_bid(self.listing.pk, self.bidder, "1.00")
+        self.assertEqual(published, [(
+            f"listing:{self.listing.pk}",
+            {"type": "bid", "listing": self.listing.pk, "price": "15.00", "bidder": "bidder"}
+        )])
+
+    async def test_event_stream_delivers_published_events(self):
+        response = await self.async_client.get(
+            reverse("listing_events", args=(self.listing.pk,))
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        get_broker().publish(
+            listing_channel(self.listing.pk), {"type": "bid", "listing": self.listing.pk}
+        )
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        self.assertTrue(chunk.startswith(b"event: bid\n"))
+        # A client disconnect cancels the pending read, like the ASGI handler
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(get_broker().subscriber_count(listing_channel(self.listing.pk)), 0)
+
+    async def test_event_stream_announces_closure_at_the_end_time(self):
+        # Closed by expire_auctions in another process, out of the broker's reach
+        ending = await sync_to_async(make_listing)(
+            self.owner, self.listing.category, ends_at=timezone.now() + timedelta(seconds=0.2)
+        )
+        response = await self.async_client.get(reverse("listing_events", args=(ending.pk,)))
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        chunk = await asyncio.wait_for(anext(stream), 2)
+        self.assertEqual(chunk, format_sse({"type": "closed", "listing": ending.pk}).encode())
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(get_broker().subscriber_count(listing_channel(ending.pk)), 0)
+
+    def test_closing_again_publishes_nothing(self):
+        self.client.force_login(self.owner)
+        url = reverse("close_auction", args=(self.listing.pk,))
+        published = []
+        with mock.patch.object(get_broker(), "publish", lambda *args: published.append(args)):
+            for _ in range(2):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(url)
+        self.assertEqual(published, [(
+            listing_channel(self.listing.pk), {"type": "closed", "listing": self.listing.pk}
+        )])
+
+    async def test_event_stream_for_unknown_listing_is_not_found(self):
+        response = await self.async_client.get(reverse("listing_events", args=(0,)))
+        self.assertEqual(response.status_code, 404)
+
+
+class WatchlistMembershipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.watcher = User.objects.create_user("watcher", "watcher@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+        cls.watched = make_listing(cls.owner, cls.category, title="Watched")
+        cls.other = make_listing(cls.owner, cls.category, title="Other")
+        cls.watched.watchlist.add(cls.watcher)
+
+    def test_is_watched_by_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.watched.is_watched_by(self.watcher))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.watched.is_watched_by(AnonymousUser()))
+        self.assertFalse(self.other.is_watched_by(self.watcher))
+
+    def test_watched_ids_for_a_page(self):
+        listings = [self.watched, self.other]
+        with self.assertNumQueries(1):
+            watched = Listing.objects.watched_ids(self.watcher, listings)
+        self.assertEqual(watched, {self.watched.pk})
+        self.assertEqual(Listing.objects.watched_ids(AnonymousUser(), listings), set())
+        other_category = Listing.objects.exclude(category=self.category)
+        self.assertEqual(other_category.watched_ids(self.watcher, listings), set())
+
+    def test_index_badges_watched_listings(self):
+        self.client.force_login(self.watcher)
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["watched_ids"], {self.watched.pk})
+        self.assertContains(response, "Watching", count=1)
+
+
+class BulkTestDataTests(TestCase):
+    def populate(self, seed):
+        call_command(
+            "populate_testdata", "--bulk", "--users", "10", "--listings", "20",
+            "--bids-per-listing", "5", "--comments-per-listing", "2",
+            "--watches-per-user", "3", "--closed-fraction", "0.5",
+            "--seed", str(seed), "--batch-size", "7", stdout=StringIO()
+        )
+
+    def test_bulk_dataset_is_consistent(self):
+        self.populate(seed=1)
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Listing.objects.count(), 20)
+        self.assertEqual(Bid.objects.count(), 100)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(Listing.watchlist.through.objects.count(), 30)
+        self.assertFalse(mismatched_listings().exists())
+        closed = Listing.objects.filter(active=False)
+        self.assertEqual(closed.count(), 10)
+        for listing in closed.select_related("price"):
+            self.assertEqual(listing.winner_id, listing.price.user_id)
+
+    def test_seed_is_deterministic(self):
+        self.populate(seed=7)
+        first = list(Bid.objects.order_by("pk").values_list("bid", flat=True))
+        Bid.objects.all().delete()
+        Listing.objects.all().delete()
+        User.objects.all().delete()
+        self.populate(seed=7)
+        second = list(Bid.objects.order_by("pk").values_list("bid", flat=True))
+        self.assertEqual(first, second)
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+        cls.listing = make_listing(cls.owner, cls.category, title="Timed")
+
+    def test_server_timing_reports_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("listing", args=(self.listing.pk,)))
+        self.assertRegex(
+            response["Server-Timing"],
+            rf'^db;dur=[\d.]+;desc="{len(queries)} queries", tpl;dur=[\d.]+, total;dur=[\d.]+$'
+        )
+
+    def test_histograms_by_view(self):
+        before = request_queries.count(view="listing")
+        self.client.get(reverse("listing", args=(self.listing.pk,)))
+        self.assertEqual(request_queries.count(view="listing"), before + 1)
+        response = self.client.get(reverse("metrics"))
+        self.assertContains(response, "# TYPE auctions_request_duration_seconds histogram")
+        self.assertContains(response, 'auctions_request_queries_bucket{view="listing",le="+Inf"}')
+        self.assertContains(response, 'auctions_request_db_duration_seconds_count{view="listing"}')
+
+    def test_large_values_are_rendered_in_full(self):
+        counter = Counter("test_large_total", "A counter past a million")
+        histogram = Histogram("test_large_seconds", "A histogram past a million", buckets=(1.0,))
+        self.addCleanup(REGISTRY.remove, counter)
+        self.addCleanup(REGISTRY.remove, histogram)
+        counter.inc(1234567)
+        for _ in range(3):
+            histogram.observe(1234567.125)
+        output = render_metrics()
+        self.assertIn("\ntest_large_total 1234567.0\n", output)
+        self.assertIn("\ntest_large_seconds_sum 3703701.375\n", output)
+        self.assertIn('\ntest_large_seconds_bucket{le="+Inf"} 3\n', output)
+        self.assertIn("\ntest_large_seconds_count 3\n", output)
+
+    @override_settings(AUCTIONS_QUERY_BUDGET=1)
+    def test_query_budget_logs_offenders(self):
+        with self.assertLogs("auctions.instrumentation", "WARNING") as logs:
+            self.client.get(reverse("listing", args=(self.listing.pk,)))
+        self.assertIn("over the budget of 1", logs.output[0])
+
+    async def test_async_views_are_instrumented(self):
+        with override_settings(ROOT_URLCONF=url_conf(async_views)):
+            response = await self.async_client.get(reverse("listing", args=(self.listing.pk,)))
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries"')
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+        cls.listing = make_listing(cls.owner, cls.category, title="Discussed")
+        now = timezone.now()
+        for i in range(25):
+            author = User.objects.create_user(f"commenter{i}")
+            Comment.objects.create(
+                comment=f"Comment {i}", listing=cls.listing, user=author,
+                created_at=now - timedelta(minutes=i)
+            )
+
+    def test_listing_renders_first_page_with_authors_joined(self):
+        get_categories()
+        url = reverse("listing", args=(self.listing.pk,))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        Comment.objects.create(comment="One more", listing=self.listing, user=self.owner)
+        with self.assertNumQueries(len(queries)):
+            self.client.get(url)
+        comments = response.context["comments"]
+        self.assertEqual([c.comment for c in comments][:2], ["Comment 0", "Comment 1"])
+        self.assertEqual(len(comments), 20)
+        self.assertContains(response, "Load older comments")
+
+    def test_fragment_endpoint_pages_through_older_comments(self):
+        first = self.client.get(reverse("listing", args=(self.listing.pk,)))
+        cursor = first.context["comments"].next_cursor
+        url = reverse("listing_comments", args=(self.listing.pk,))
+        response = self.client.get(url, {"cursor": cursor})
+        self.assertContains(response, "commenter24")
+        self.assertContains(response, "comment-item", count=5)
+        self.assertNotIn("X-Next-Cursor", response)
+
+        data = self.client.get(url, {"format": "json"}).json()
+        self.assertEqual(len(data["comments"]), 20)
+        self.assertEqual(data["comments"][0]["user"], "commenter0")
+        self.assertEqual(data["next_cursor"], cursor)
+
+    def test_fragment_endpoint_rejects_bad_requests(self):
+        url = reverse("listing_comments", args=(self.listing.pk,))
+        self.assertEqual(self.client.get(url, {"cursor": "garbage"}).status_code, 404)
+        url = reverse("listing_comments", args=(0,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+        cls.listing = make_listing(cls.owner, cls.category, title="Routed")
+
+    def test_router_sends_only_replica_reads_to_the_replica(self):
+        router = PrimaryReplicaRouter()
+        with mock.patch.dict(settings.DATABASES, {"replica": settings.DATABASES["default"]}):
+            self.assertEqual(router.db_for_read(Listing), "default")
+            with read_from_replica():
+                self.assertEqual(router.db_for_read(Listing), "replica")
+                self.assertEqual(router.db_for_write(Listing), "default")
+        with read_from_replica():
+            # Without a configured replica everything stays on the primary
+            self.assertEqual(router.db_for_read(Listing), "default")
+        self.assertFalse(router.allow_migrate("replica", "auctions"))
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        self.client.force_login(self.bidder)
+        response = self.client.post(reverse("add_bid", args=(self.listing.pk,)), {"bid": "20"})
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.AUCTIONS_REPLICA_STICKY_SECONDS)
+        self.assertNotIn(STICKY_COOKIE, self.client.get(reverse("index")).cookies)
+
+    def test_replica_reads_skips_sticky_clients(self):
+        view = replica_reads(lambda request: replica_enabled.get())
+        request = RequestFactory().get("/")
+        self.assertTrue(view(request))
+        self.assertFalse(replica_enabled.get())
+        request.COOKIES[STICKY_COOKIE] = "1"
+        self.assertFalse(view(request))
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite backend")
+class TunedSQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "tuned.sqlite3")
+        self.wrapper = TunedDatabaseWrapper(
+            {**connection.settings_dict, "NAME": self.path, "OPTIONS": {}}
+        )
+        self.addCleanup(self.wrapper.close)
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_connections_apply_the_pragmas(self):
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+
+    def test_begin_immediate_takes_the_write_lock(self):
+        self.wrapper.ensure_connection()
+        self.wrapper.begin_immediate = True
+        self.wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, "database is locked"):
+            other.execute("BEGIN IMMEDIATE")
+        self.wrapper.rollback()
+        self.wrapper.set_autocommit(True)
+        self.assertFalse(self.wrapper.begin_immediate)
+
+
+class BidHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+        start = timezone.now() - timedelta(days=1)
+        cls.listing = make_listing(cls.owner, cls.category, title="Charted", created_at=start)
+        Bid.objects.bulk_create(
+            Bid(
+                bid=Decimal(11 + n), user=cls.bidder, listing=cls.listing,
+                created_at=start + timedelta(seconds=n)
+            )
+            for n in range(120)
+        )
+        Listing.objects.filter(pk=cls.listing.pk).refresh_bid_aggregates()
+
+    def test_bid_time_matches_last_bid_at(self):
+        result = place_bid(self.listing.pk, self.bidder, Decimal("500"))
+        self.listing.refresh_from_db()
+        self.assertEqual(result.bid.created_at, self.listing.last_bid_at)
+
+    def test_listing_history_pages_newest_first(self):
+        url = reverse("listing_bids", args=(self.listing.pk,))
+        data = self.client.get(url).json()
+        self.assertEqual(len(data["bids"]), 50)
+        self.assertEqual(data["bids"][0]["amount"], "130.00")
+        self.assertEqual(data["bids"][0]["user"], "bidder")
+        seen = len(data["bids"])
+        while data["next_cursor"]:
+            data = self.client.get(url, {"cursor": data["next_cursor"]}).json()
+            seen += len(data["bids"])
+        self.assertEqual(seen, 120)
+        self.assertEqual(data["bids"][-1]["amount"], "11.00")
+
+    def test_user_history_requires_login(self):
+        url = reverse("user_bids")
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.bidder)
+        data = self.client.get(url).json()
+        self.assertEqual(data["bids"][0]["title"], "Charted")
+        self.assertIsNotNone(data["next_cursor"])
+
+    def test_price_series_is_downsampled_and_cached(self):
+        url = reverse("listing_price_series", args=(self.listing.pk,))
+        points = self.client.get(url, {"points": 10}).json()["points"]
+        self.assertEqual(len(points), 11)
+        self.assertEqual(points[0][1], "10.00")  # The starting price
+        self.assertEqual(points[-1][1], "130.00")
+        self.assertEqual([p[1] for p in points[1:3]], ["22.00", "34.00"])
+        with self.assertNumQueries(1):
+            self.client.get(url, {"points": 10})
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite parameter limit")
+    def test_largest_series_fits_old_sqlite_parameter_limits(self):
+        connection.ensure_connection()
+        limit = connection.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        self.addCleanup(connection.connection.setlimit, sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+        url = reverse("listing_price_series", args=(self.listing.pk,))
+        points = self.client.get(url, {"points": 100000}).json()["points"]
+        self.assertEqual(points[-1][1], "130.00")
+
+
+class ListingAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+        cls.listing = make_listing(cls.owner, cls.category, title="Cached")
+
+    def revalidate(self, url, etag, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_listing_detail_revalidates_until_a_bid(self):
+        url = reverse("api_listing", args=(self.listing.pk,))
+        response = self.client.get(url)
+        self.assertEqual(response.json()["current_price"], "10.00")
+        self.assertEqual(response.json()["owner"], "owner")
+        etag = response["ETag"]
+        get_categories()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        place_bid(self.listing.pk, self.bidder, Decimal("12"))
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["current_price"], "12.00")
+        self.assertEqual(self.client.get(reverse("api_listing", args=(0,))).status_code, 404)
+
+    def test_listings_page_changes_with_new_listings(self):
+        url = reverse("api_listings")
+        response = self.client.get(url, {"category": "Books"})
+        self.assertEqual([item["title"] for item in response.json()["listings"]], ["Cached"])
+        etag = response["ETag"]
+        self.assertEqual(self.revalidate(url, etag, category="Books").status_code, 304)
+        make_listing(self.owner, self.category, title="Fresh")
+        self.assertEqual(self.revalidate(url, etag, category="Books").status_code, 200)
+        self.assertEqual(self.client.get(url, {"category": "Nope"}).status_code, 404)
+
+    def test_categories_change_with_the_cache_version(self):
+        url = reverse("api_categories")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        Category.objects.create(name="Toys")
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["categories"]), 2)
+
+    def test_watchlist_is_private(self):
+        url = reverse("api_watchlist")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.bidder)
+        response = self.client.get(url)
+        self.assertEqual(response.json()["listings"], [])
+        self.assertIn("private", response["Cache-Control"])
+        self.listing.watchlist.add(self.bidder)
+        response = self.revalidate(url, response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["listings"][0]["id"], self.listing.pk)
+
+
+class WatchlistDigestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.watcher = User.objects.create_user("watcher", "watcher@example.com", "pw")
+        cls.rival = User.objects.create_user("rival", "rival@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+        cls.listings = [
+            make_listing(cls.owner, cls.category, title=f"Watched {n}") for n in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.watcher)
+
+    def ids(self):
+        return set(self.watcher.watchlist_listings.values_list("pk", flat=True))
+
+    def test_bulk_add_and_remove_with_json(self):
+        pks = [listing.pk for listing in self.listings]
+        response = self.client.post(
+            reverse("bulk_add_watchlist"), {"ids": pks + [0]}, content_type="application/json"
+        )
+        self.assertEqual(response.json()["watched"], pks)
+        self.assertEqual(self.ids(), set(pks))
+        # Adding listings already watched is not an error
+        self.client.post(reverse("bulk_add_watchlist"), {"ids": pks[:1]}, content_type="application/json")
+        response = self.client.post(
+            reverse("bulk_remove_watchlist"), {"ids": pks[:2]}, content_type="application/json"
+        )
+        self.assertEqual(response.json()["removed"], 2)
+        self.assertEqual(self.ids(), {pks[2]})
+
+    def test_bulk_remove_from_form_redirects(self):
+        self.listings[0].watchlist.add(self.watcher)
+        response = self.client.post(reverse("bulk_remove_watchlist"), {"ids": [self.listings[0].pk]})
+        self.assertRedirects(response, reverse("watchlist"))
+        self.assertEqual(self.ids(), set())
+
+    def test_bulk_rejects_bad_ids(self):
+        url = reverse("bulk_add_watchlist")
+        self.assertEqual(self.client.post(url, {"ids": ["x"]}).status_code, 400)
+        self.assertEqual(self.client.post(url, {}).status_code, 400)
+        too_many = list(range(1, views.MAX_BULK_IDS + 2))
+        self.assertEqual(
+            self.client.post(url, {"ids": too_many}, content_type="application/json").status_code, 400
+        )
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+    def test_watchlist_shows_changes_since_last_visit(self):
+        quiet, outbid, leading = self.listings
+        for listing in self.listings:
+            listing.watchlist.add(self.watcher)
+        place_bid(outbid.pk, self.watcher, Decimal("11"))
+        place_bid(leading.pk, self.watcher, Decimal("11"))
+        self.client.get(reverse("watchlist"))
+        self.watcher.refresh_from_db()
+        self.assertIsNotNone(self.watcher.watchlist_seen_at)
+
+        place_bid(outbid.pk, self.rival, Decimal("12"))
+        place_bid(outbid.pk, self.rival, Decimal("13"))
+        place_bid(leading.pk, self.rival, Decimal("12"))
+        place_bid(leading.pk, self.watcher, Decimal("14"))
+        response = self.client.get(reverse("watchlist"))
+        digest = {
+            listing.pk: (listing.new_bids, listing.outbid)
+            for listing in response.context["listings"]
+        }
+        self.assertEqual(digest, {quiet.pk: (0, False), outbid.pk: (2, True), leading.pk: (2, False)})
+        self.assertEqual(response.context["outbid_count"], 1)
+        self.assertContains(response, "+2 new bids", count=2)
+
+        # The visit resets the digest
+        response = self.client.get(reverse("watchlist"))
+        self.assertEqual(response.context["outbid_count"], 0)
+        self.assertNotContains(response, "new bid")
+
+
+class AdminScalingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.category = Category.objects.create(name="Books")
+        cls.listing = make_listing(cls.admin, cls.category, title="Busy")
+        Bid.objects.bulk_create(
+            Bid(bid=Decimal(11 + n), user=cls.admin, listing=cls.listing)
+            for n in range(auctions_admin.INLINE_BIDS + 10)
+        )
+        Listing.objects.filter(pk=cls.listing.pk).refresh_bid_aggregates()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, model):
+        url = reverse(f"admin:auctions_{model}_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for model in ("listing", "bid"):
+            before = self.changelist_queries(model)
+            owner = User.objects.create_user(f"{model}-owner")
+            listing = make_listing(owner, Category.objects.create(name=model))
+            Bid.objects.create(bid=Decimal("20"), user=owner, listing=listing)
+            self.assertEqual(self.changelist_queries(model), before)
+
+    def test_change_page_shows_only_the_latest_bids(self):
+        url = reverse("admin:auctions_listing_change", args=(self.listing.pk,))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertLess(len(queries), 15)
+        self.assertEqual(
+            len(re.findall(r"/admin/auctions/bid/\d+/change/", response.content.decode())),
+            auctions_admin.INLINE_BIDS
+        )
+        self.assertContains(response, f"{10 + auctions_admin.INLINE_BIDS + 10}.00</a>")
+        self.assertNotContains(response, ">11.00</a>")
+        [new] = (inline.formset for inline in response.context["inline_admin_formsets"])
+        self.assertEqual(new.initial_form_count(), 0)
+        self.assertEqual(len(new.forms), 1)
+
+    def test_bid_added_from_the_change_page(self):
+        url = reverse("admin:auctions_listing_change", args=(self.listing.pk,))
+        formsets = self.client.get(url).context["inline_admin_formsets"]
+        data = {
+            "title": self.listing.title,
+            "description": self.listing.description,
+            "starting_price": self.listing.starting_price,
+            "category": self.category.pk,
+            "owner": self.admin.pk,
+            "active": "on",
+            "created_at_0": self.listing.created_at.date(),
+            "created_at_1": self.listing.created_at.time(),
+        }
+        for inline in formsets:
+            formset = inline.formset
+            data.update({
+                f"{formset.prefix}-TOTAL_FORMS": len(formset.forms),
+                f"{formset.prefix}-INITIAL_FORMS": formset.initial_form_count(),
+            })
+            for form in formset.initial_forms:
+                data[f"{form.prefix}-id"] = form.instance.pk
+                data[f"{form.prefix}-listing"] = self.listing.pk
+        prefix = formsets[0].formset.forms[0].prefix
+        data.update({f"{prefix}-bid": "500", f"{prefix}-user": self.admin.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        # Independent of the listing's bids
+        self.assertLess(len(queries), 30)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal("500"))
+
+    def test_unfiltered_count_is_estimated_for_large_tables(self):
+        url = reverse("admin:auctions_bid_changelist")
+        with mock.patch.object(auctions_admin, "ESTIMATED_COUNT_THRESHOLD", 10):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        self.assertEqual(response.context["cl"].result_count, Bid.objects.aggregate(Max("pk"))["pk__max"])
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+        response = self.client.get(url)
+        self.assertEqual(response.context["cl"].result_count, Bid.objects.count())
+
+
+class ImportBidsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        category = Category.objects.create(name="Books")
+        cls.open = make_listing(cls.owner, category, title="Open")
+        cls.closed = make_listing(cls.owner, category, title="Closed", active=False)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as file:
+            file.write(text)
+        return path
+
+    def import_bids(self, path, *args):
+        call_command("import_bids", path, "--chunk-size", "2", *args, stdout=StringIO())
+
+    def test_imports_csv_and_rebuilds_aggregates_once(self):
+        path = self.write("bids.csv", "\n".join([
+            "listing,user,username,amount,created_at",
+            f"{self.open.pk},{self.alice.pk},,11,2024-01-01T10:00:00+00:00",
+            f"{self.open.pk},,bob,12.50,2024-01-01T11:00:00+00:00",
+            f"{self.closed.pk},,alice,20,2024-01-02T10:00:00",
+            f"{self.closed.pk},{self.bob.pk},,15,2024-01-02T09:00:00",
+            f"{self.closed.pk},,nobody,30,",
+            f"{self.open.pk},{self.alice.pk},,5,",
+            "0,1,,50,",
+            f"{self.open.pk},{self.alice.pk},,12.345,",
+        ]) + "\n")
+        rejects = os.path.join(self.directory, "rejects.jsonl")
+        self.import_bids(path, "--rejects", rejects)
+
+        self.assertEqual(Bid.objects.count(), 4)
+        self.assertFalse(mismatched_listings().exists())
+        self.open.refresh_from_db()
+        self.closed.refresh_from_db()
+        self.assertEqual(self.open.current_price, Decimal("12.50"))
+        self.assertIsNone(self.open.winner)
+        self.assertEqual(self.closed.current_price, Decimal("20"))
+        self.assertEqual(self.closed.winner, self.alice)
+        with open(rejects) as file:
+            reasons = [json.loads(line)["reason"] for line in file]
+        self.assertCountEqual(reasons, [
+            "Unknown user", "Bid is not above the starting price of 10.00",
+            "Unknown listing", "Invalid amount",
+        ])
+        self.assertFalse(os.path.exists(path + ".checkpoint"))
+
+    def test_resumes_from_checkpoint_without_duplicates(self):
+        rows = [
+            {"listing": self.open.pk, "username": "alice", "amount": 11 + n,
+             "created_at": f"2024-01-01T10:00:0{n}+00:00"}
+            for n in range(6)
+        ]
+        path = self.write("bids.jsonl", "".join(json.dumps(row) + "\n" for row in rows))
+        with mock.patch.object(import_bids.Command, "finish", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.import_bids(path)
+        self.assertEqual(Bid.objects.count(), 6)
+
+        # Pretend the run stopped after committing its last chunk but before
+        # recording it
+        checkpoint = path + ".checkpoint"
+        with open(checkpoint) as file:
+            entries = file.readlines()
+        with open(checkpoint, "w") as file:
+            file.writelines(entries[:-1])
+            file.write(entries[-1][:10])
+        self.import_bids(path)
+
+        self.assertEqual(Bid.objects.count(), 6)
+        self.open.refresh_from_db()
+        self.assertEqual(self.open.bid_count, 6)
+        self.assertEqual(self.open.current_price, Decimal("16"))
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def interrupt_and_resume(self, path):
+        """Imports, then resumes as if the last chunk was never recorded"""
+        with mock.patch.object(import_bids.Command, "finish", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.import_bids(path)
+        checkpoint = path + ".checkpoint"
+        with open(checkpoint) as file:
+            entries = file.readlines()
+        with open(checkpoint, "w") as file:
+            file.writelines(entries[:-1])
+        self.import_bids(path)
+
+    def test_resume_recognizes_rows_without_created_at(self):
+        rows = [{"listing": self.open.pk, "username": "alice", "amount": 11 + n} for n in range(6)]
+        path = self.write("bids.jsonl", "".join(json.dumps(row) + "\n" for row in rows))
+        self.interrupt_and_resume(path)
+
+        self.assertEqual(Bid.objects.count(), 6)
+        # Stamped in file order
+        self.assertEqual(
+            list(Bid.objects.order_by("created_at").values_list("bid", flat=True)),
+            [Decimal(11 + n) for n in range(6)]
+        )
+
+    def test_csv_fields_may_span_lines(self):
+        path = self.write("bids.csv", "".join([
+            "listing,username,amount,note\n",
+            f'{self.open.pk},alice,11,"first\nline"\n',
+            f'{self.open.pk},bob,12,"second\n\nline"\n',
+            f"{self.open.pk},alice,13,\n",
+        ]))
+        self.interrupt_and_resume(path)
+
+        self.assertEqual(
+            sorted(Bid.objects.values_list("user__username", "bid")),
+            [("alice", Decimal(11)), ("alice", Decimal(13)), ("bob", Decimal(12))]
+        )
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        cls.bidder = User.objects.create_user("bidder")
+        category = Category.objects.create(name="Books")
+        cls.listing = make_listing(cls.staff, category, title="Exported")
+        cls.listing.watchlist.add(cls.bidder)
+        for amount in ("11", "12.50", "13"):
+            place_bid(cls.listing.pk, cls.bidder, Decimal(amount))
+        Comment.objects.create(comment='Says "hi", twice\nreally', user=cls.bidder, listing=cls.listing)
+
+    def export(self, *args):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        call_command(
+            "export_data", *args, "--output-dir", directory.name, "--chunk-size", "2",
+            stdout=StringIO()
+        )
+        return directory.name
+
+    def test_command_writes_csv_and_jsonl(self):
+        directory = self.export()
+        self.assertEqual(
+            sorted(os.listdir(directory)),
+            ["bids.csv", "comments.csv", "listings.csv", "watchlist.csv"]
+        )
+        with open(os.path.join(directory, "bids.csv"), newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([row["amount"] for row in rows], ["11.00", "12.50", "13.00"])
+        self.assertEqual(rows[0]["user_id"], str(self.bidder.pk))
+        with open(os.path.join(directory, "comments.csv"), newline="") as file:
+            self.assertEqual(next(csv.DictReader(file))["comment"], 'Says "hi", twice\nreally')
+
+        directory = self.export("listings", "watchlist", "--format", "jsonl")
+        with open(os.path.join(directory, "listings.jsonl")) as file:
+            listing = json.loads(file.readline())
+        self.assertEqual(listing["current_price"], "13.00")
+        self.assertEqual(listing["category"], "Books")
+        self.assertIsNone(listing["winner_id"])
+        self.assertEqual(
+            datetime.fromisoformat(listing["created_at"]), self.listing.created_at
+        )
+        with open(os.path.join(directory, "watchlist.jsonl")) as file:
+            self.assertEqual(
+                [json.loads(line) for line in file],
+                [{"listing_id": self.listing.pk, "user_id": self.bidder.pk}]
+            )
+
+    @skipUnless(importlib.util.find_spec("pyarrow"), "needs pyarrow")
+    def test_command_writes_parquet(self):
+        import pyarrow.parquet
+        directory = self.export("bids", "--format", "parquet")
+        table = pyarrow.parquet.read_table(os.path.join(directory, "bids.parquet"))
+        self.assertEqual(table.column("amount").to_pylist(), [Decimal("11"), Decimal("12.5"), Decimal("13")])
+
+    def test_endpoint_is_staff_only(self):
+        url = reverse("export_data", args=("bids", "csv"))
+        self.assertRedirects(
+            self.client.get(url), f"{reverse('login')}?next={url}", fetch_redirect_response=False
+        )
+        self.client.force_login(self.bidder)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_endpoint_streams(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("export_data", args=("bids", "csv")))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="bids.csv"')
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,listing_id,user_id,amount,created_at")
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(self.client.get(reverse("export_data", args=("users", "csv"))).status_code, 404)
+        self.assertEqual(self.client.get(reverse("export_data", args=("bids", "xml"))).status_code, 404)
+
+    async def test_endpoint_streams_async_under_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse("export_data", args=("comments", "jsonl")))
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(content)["listing_id"], self.listing.pk)
+
+
+class TrendingFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+        cls.bidders = [User.objects.create_user(f"bidder{n}") for n in range(3)]
+        cls.category = Category.objects.create(name="Books")
+        cls.hot, cls.warm, cls.stale = (
+            make_listing(cls.owner, cls.category, title=title)
+            for title in ("Hot", "Warm", "Stale")
+        )
+        long_ago = timezone.now() - timedelta(days=3)
+        Bid.objects.bulk_create(
+            [Bid(bid=Decimal(11 + n), user=cls.bidders[0], listing=cls.hot) for n in range(3)]
+            + [Bid(bid=Decimal(11 + n), user=cls.bidders[0], listing=cls.warm) for n in range(2)]
+            + [
+                Bid(bid=Decimal(11 + n), user=cls.bidders[0], listing=cls.stale, created_at=long_ago)
+                for n in range(5)
+            ]
+        )
+        Listing.objects.refresh_bid_aggregates()
+        for bidder in cls.bidders:
+            cls.warm.watchlist.add(bidder)
+
+    def ranking(self):
+        return list(ListingScore.objects.order_by("-score", "-listing_id").values_list(
+            "listing__title", "recent_bids", "watchers"
+        ))
+
+    def test_refresh_ranks_recent_bids_and_watchers(self):
+        self.assertEqual(refresh_trending(), 2)
+        self.assertEqual(self.ranking(), [("Warm", 2, 3), ("Hot", 3, 0)])
+        self.assertEqual(refresh_trending(size=1), 1)
+        self.assertEqual(self.ranking(), [("Warm", 2, 3)])
+        Listing.objects.filter(pk=self.warm.pk).close()
+        refresh_trending()
+        self.assertEqual(self.ranking(), [("Hot", 3, 0)])
+
+    def test_bids_and_watchers_bump_scores_between_refreshes(self):
+        refresh_trending()
+        with self.captureOnCommitCallbacks(execute=True):
+            place_bid(self.hot.pk, self.bidders[1], Decimal("100"))
+            place_bid(self.stale.pk, self.bidders[1], Decimal("100"))
+        self.hot.watchlist.add(self.bidders[2])
+        self.bidders[2].watchlist_listings.remove(self.warm)
+        self.assertEqual(self.ranking(), [("Hot", 4, 1), ("Warm", 2, 2), ("Stale", 1, 0)])
+        refresh_trending()
+        self.assertEqual(self.ranking(), [("Hot", 4, 1), ("Warm", 2, 2), ("Stale", 1, 0)])
+
+    def test_bulk_watchlist_changes_and_clears_bump_scores(self):
+        refresh_trending()
+        self.hot.watchlist.add(*self.bidders)
+        self.assertEqual(self.ranking(), [("Hot", 3, 3), ("Warm", 2, 3)])
+        self.bidders[0].watchlist_listings.clear()
+        self.assertEqual(self.ranking(), [("Hot", 3, 2), ("Warm", 2, 2)])
+        self.hot.watchlist.clear()
+        self.assertEqual(self.ranking(), [("Warm", 2, 2), ("Hot", 3, 0)])
+        refresh_trending()
+        self.assertEqual(self.ranking(), [("Warm", 2, 2), ("Hot", 3, 0)])
+
+    def test_unranked_listing_enters_only_by_beating_the_lowest(self):
+        refresh_trending()
+        fresh = make_listing(self.owner, self.category, title="Fresh")
+        fresh.watchlist.add(*[User.objects.create_user(f"fan{n}") for n in range(6)])
+        with mock.patch.object(feeds, "TRENDING_SIZE", 2):
+            with self.captureOnCommitCallbacks(execute=True):
+                place_bid(self.stale.pk, self.bidders[1], Decimal("100"))
+            self.assertEqual(self.ranking(), [("Warm", 2, 3), ("Hot", 3, 0)])
+            with self.captureOnCommitCallbacks(execute=True):
+                place_bid(fresh.pk, self.bidders[1], Decimal("100"))
+            self.assertEqual(self.ranking(), [("Fresh", 1, 6), ("Warm", 2, 3)])
+
+    def test_failed_score_bump_does_not_fail_the_bid(self):
+        with mock.patch("auctions.bidding.bump_bid_score", side_effect=OperationalError):
+            with self.assertLogs(level="ERROR"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    result = place_bid(self.hot.pk, self.bidders[1], Decimal("100"))
+        self.assertTrue(result.accepted)
+        self.assertEqual(Bid.objects.filter(listing=self.hot, bid=Decimal("100")).count(), 1)
+
+    def test_feed_pages(self):
+        call_command("refresh_feeds", "--once", stdout=StringIO())
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("trending"))
+        self.assertEqual([listing.title for listing in response.context["listings"]], ["Warm", "Hot"])
+
+        now = timezone.now()
+        Listing.objects.filter(pk=self.hot.pk).update(ends_at=now + timedelta(hours=2))
+        Listing.objects.filter(pk=self.warm.pk).update(ends_at=now + timedelta(hours=1))
+        Listing.objects.filter(pk=self.stale.pk).update(ends_at=now - timedelta(hours=1))
+        response = self.client.get(reverse("ending_soon"))
+        self.assertEqual([listing.title for listing in response.context["listings"]], ["Warm", "Hot"])
+
+    async def test_async_feed_pages(self):
+        await sync_to_async(refresh_trending)()
+        await Listing.objects.filter(pk=self.hot.pk).aupdate(ends_at=timezone.now() + timedelta(hours=1))
+        with override_settings(ROOT_URLCONF=url_conf(async_views)):
+            response = await self.async_client.get(reverse("trending"))
+            self.assertEqual([listing.title for listing in response.context["listings"]], ["Warm", "Hot"])
+            response = await self.async_client.get(reverse("ending_soon"))
+            self.assertEqual([listing.title for listing in response.context["listings"]], ["Hot"])
+
+
+@override_settings(
+    AUCTIONS_RATE_LIMIT=True,
+    AUCTIONS_RATE_LIMITS={
+        "bid": {"user": (60, 3), "ip": (60, 5)},
+        "comment": {"user": (60, 2), "ip": (60, 10)},
+        "watchlist": {"user": (60, 10), "ip": (60, 10)},
+    }
+)
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+        cls.bidder = User.objects.create_user("bidder")
+        cls.listing = make_listing(cls.owner, Category.objects.create(name="Books"))
+
+    def setUp(self):
+        cache.clear()
+        local_buckets.clear()
+        self.client.force_login(self.bidder)
+
+    def test_bucket_refills_at_the_rate(self):
+        full_at, wait = 0, 0
+        for _ in range(3):
+            full_at, wait = take_token(full_at, 1.0, 3, 100.0)
+            self.assertEqual(wait, 0)
+        self.assertEqual(take_token(full_at, 1.0, 3, 100.0), (full_at, 1.0))
+        self.assertEqual(take_token(full_at, 1.0, 3, 101.0)[1], 0)
+
+    def test_user_over_the_limit_gets_a_cheap_429(self):
+        url = reverse("add_comment", args=(self.listing.pk,))
+        for n in range(2):
+            self.client.post(url, {"comment": f"Comment {n}"})
+        rejected = rate_limited_requests.value(scope="comment", key="user")
+        # The session and user lookups only; no template is rendered
+        with self.assertNumQueries(2), self.assertTemplateNotUsed("auctions/listing.html"):
+            response = self.client.post(url, {"comment": "One too many"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(rate_limited_requests.value(scope="comment", key="user"), rejected + 1)
+
+    def test_address_over_the_limit_is_rejected_before_any_query(self):
+        self.client.logout()
+        url = reverse("add_watchlist", args=(self.listing.pk,))
+        for _ in range(10):
+            self.client.get(url, REMOTE_ADDR="10.0.0.1")
+        with self.assertNumQueries(0):
+            response = self.client.get(url, REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="10.0.0.2").status_code, 302)
+
+    def test_scopes_have_separate_buckets(self):
+        for n in range(2):
+            self.client.post(reverse("add_comment", args=(self.listing.pk,)), {"comment": "Hi"})
+        response = self.client.post(reverse("add_bid", args=(self.listing.pk,)), {"bid": "11"})
+        self.assertContains(response, "Success bid")
+
+    @override_settings(AUCTIONS_RATE_LIMIT=False)
+    def test_limits_can_be_turned_off(self):
+        url = reverse("add_comment", args=(self.listing.pk,))
+        for n in range(4):
+            self.assertEqual(self.client.post(url, {"comment": "Hi"}).status_code, 302)
+
+    def test_buckets_fall_back_to_memory_without_the_cache(self):
+        url = reverse("add_comment", args=(self.listing.pk,))
+        with mock.patch("auctions.throttling.cache.get", side_effect=ConnectionError):
+            statuses = [self.client.post(url, {"comment": "Hi"}).status_code for _ in range(3)]
+        self.assertEqual(statuses, [302, 302, 429])
+
+    def test_resubmitted_bid_is_not_answered_from_an_earlier_flight(self):
+        url = reverse("add_bid", args=(self.listing.pk,))
+        self.assertContains(self.client.post(url, {"bid": "12"}), "Success bid")
+        place_bid(self.listing.pk, self.owner, Decimal("15"))
+        response = self.client.post(url, {"bid": "12"})
+        self.assertContains(response, "Bid must be greater than current price of $15.00")
+        self.assertEqual(Bid.objects.filter(listing=self.listing).count(), 2)
+
+    def test_waits_for_an_identical_call_in_another_process(self):
+        # Another process holds the marker and stores its result under its token
+        cache.add("sf:other:pending", "token", 5)
+
+        def finish():
+            time.sleep(0.1)
+            cache.set("sf:other:pending:token", "placed elsewhere", 5)
+            cache.delete("sf:other:pending")
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        coalesced = coalesced_requests.value()
+        self.assertEqual(single_flight("other", mock.Mock(side_effect=AssertionError)), "placed elsewhere")
+        thread.join()
+        self.assertEqual(coalesced_requests.value(), coalesced + 1)
+        # Once it has returned the result is not shared any more
+        self.assertEqual(single_flight("other", lambda: "placed here"), "placed here")
+
+    def test_concurrent_identical_calls_run_once(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "placed"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight("same", slow)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(single_flight("same", slow)))
+            for _ in range(3)
+        ]
+        for thread in followers:
+            thread.start()
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join()
+        self.assertEqual(results, ["placed"] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_call_is_not_shared(self):
+        with self.assertRaises(ValueError):
+            single_flight("failing", mock.Mock(side_effect=ValueError))
+        self.assertEqual(single_flight("failing", lambda: "retried"), "retried")
+
+
+class BenchViewsCommandTests(SimpleTestCase):
+    def test_database_settings_are_restored(self):
+        test_settings = connection.settings_dict["TEST"]
+        old_test_name = test_settings.get("NAME")
+        with mock.patch.object(connection.creation, "create_test_db"), \
+                mock.patch.object(connection.creation, "destroy_test_db"):
+            with test_database():
+                pass
+        self.assertEqual(test_settings.get("NAME"), old_test_name)
+
+    def test_runs_every_scenario_under_the_default_limits(self):
+        # In a separate process: the command creates and drops its own
+        # database. More bids than the per-user burst are placed.
+        env = {**os.environ, "AUCTIONS_RATE_LIMIT": "1"}
+        if connection.vendor == "sqlite":
+            # Connecting would otherwise create an empty db.sqlite3 here
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            env["AUCTIONS_DB_NAME"] = os.path.join(directory.name, "db.sqlite3")
+        result = subprocess.run(
+            [
+                sys.executable, "manage.py", "bench_views", "--repeat", "12",
+                "--alloc-repeat", "1", "--users", "5", "--listings", "40",
+                "--bids-per-listing", "2", "--watches", "3",
+            ],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env=env
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(
+            set(json.loads(result.stdout)["views"]),
+            {"index", "display_category", "listing", "watchlist", "add_bid", "close_auction"}
+        )
+
+
+@override_settings(ROOT_URLCONF=url_conf(async_views))
+class AsyncReadViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.books = Category.objects.create(name="Books")
+        cls.listing = make_listing(cls.owner, cls.books, title="Async novel")
+        Comment.objects.create(comment="Still available?", listing=cls.listing, user=cls.bidder)
+        cls.listing.watchlist.add(cls.bidder)
+
+    async def test_index_and_category(self):
+        response = await self.async_client.get(reverse("index"))
+        self.assertIs(response.resolver_match.func, async_views.index)
+        self.assertContains(response, "Async novel")
+        response = await self.async_client.get(reverse("display_category"), {"category": "Books"})
+        self.assertContains(response, "Async novel")
+        self.assertEqual(response.context["selected_category"], "Books")
+
+    async def test_listing_gathers_comments_and_watch_state(self):
+        await self.async_client.aforce_login(self.bidder)
+        response = await self.async_client.get(reverse("listing", args=(self.listing.pk,)))
+        self.assertContains(response, "Still available?")
+        self.assertTrue(response.context["isListingInWatchlist"])
+        self.assertFalse(response.context["isOwner"])
+        response = await self.async_client.get(reverse("listing", args=(0,)))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_watchlist_requires_login(self):
+        response = await self.async_client.get(reverse("watchlist"))
+        self.assertRedirects(response, reverse("login") + "?next=" + reverse("watchlist"), fetch_redirect_response=False)
+        await self.async_client.aforce_login(self.bidder)
+        response = await self.async_client.get(reverse("watchlist"))
+        self.assertContains(response, "Async novel")
@@ -0,0 +1,220 @@
+"""
+Rate limiting and coalescing of the write endpoints.
+
+Each scope in AUCTIONS_RATE_LIMITS has a token bucket per client address and
+per signed-in user, kept in the cache as the time the bucket will be full
+again (GCRA), so one cache read and write decide a request. The address is
+checked first: a rejected anonymous flood costs no database query. While the
+cache is unreachable the buckets fall back to process memory. Two processes
+updating the same bucket at once can both let a request through; the limits
+are meant to stop floods, not to count exactly.
+
+single_flight() collapses identical submissions (double clicks, retried
+posts) that arrive while the first one runs into a single call.
+"""
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .metrics import coalesced_requests, rate_limited_requests
+
+LOCAL_BUCKETS_SIZE = 10000
+COALESCE_SECONDS = 5
+COALESCE_POLL = 0.05
+
+
+class LocalBuckets:
+    """The buckets of this process, least recently used ones evicted first"""
+
+    def __init__(self, size=LOCAL_BUCKETS_SIZE):
+        self.size = size
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, interval, capacity, now):
+        with self.lock:
+            full_at = self.buckets.pop(key, now)
+            full_at, wait = take_token(full_at, interval, capacity, now)
+            self.buckets[key] = full_at
+            while len(self.buckets) > self.size:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+local_buckets = LocalBuckets()
+
+
+def take_token(full_at, interval, capacity, now):
+    """
+    Takes a token from a bucket that refills one token every `interval`
+    seconds up to `capacity` and is full again at `full_at`. Returns the new
+    full_at and 0, or full_at unchanged and the seconds until a token is free.
+    """
+    full_at = max(full_at, now)
+    wait = full_at + interval - capacity * interval - now
+    if wait > 0:
+        return full_at, wait
+    return full_at + interval, 0
+
+
+def take(key, rate, burst):
+    """
+    Takes a token from the bucket `key` of `rate` requests per minute and
+    `burst` tokens; returns the seconds to wait, 0 if the request may go on
+    """
+    interval = 60 / rate
+    now = time.time()
+    try:
+        full_at, wait = take_token(cache.get(key, now), interval, burst, now)
+        if not wait:
+            cache.set(key, full_at, math.ceil(full_at - now))
+    except Exception:
+        # Cache backend down (Redis unreachable and the like)
+        return local_buckets.take(key, interval, burst, now)
+    return wait
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR") or "unknown"
+
+
+def too_many_requests(scope, key, wait):
+    """The rejection: plain text, no template or database work"""
+    rate_limited_requests.inc(scope=scope, key=key)
+    response = HttpResponse(
+        "Too many requests, try again later.\n",
+        status=429,
+        content_type="text/plain; charset=utf-8"
+    )
+    response["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+def rate_limit(scope):
+    """
+    Rejects requests to the view with 429 once the client address or the
+    signed-in user has used up its bucket in AUCTIONS_RATE_LIMITS[scope]
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.AUCTIONS_RATE_LIMIT:
+                limits = settings.AUCTIONS_RATE_LIMITS[scope]
+                wait = take(f"rl:{scope}:ip:{client_ip(request)}", *limits["ip"])
+                if wait:
+                    return too_many_requests(scope, "ip", wait)
+                if request.user.is_authenticated:
+                    wait = take(f"rl:{scope}:u:{request.user.pk}", *limits["user"])
+                    if wait:
+                        return too_many_requests(scope, "user", wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+in_flight = {}
+in_flight_lock = threading.Lock()
+
+
+def single_flight(key, fn, timeout=COALESCE_SECONDS):
+    """
+    Calls fn() once for identical calls made while it runs, in this process
+    or, through the cache, in another one, and gives them all its result.
+    Only calls still in flight share it: a call made after fn() returned
+    runs fn() again. A caller that waits longer than `timeout`, or whose
+    leader failed, calls fn() itself.
+    """
+    with in_flight_lock:
+        flight = in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = in_flight[key] = Flight()
+    if not leader:
+        if flight.done.wait(timeout) and not flight.failed:
+            coalesced_requests.inc()
+            return flight.result
+        return fn()
+
+    try:
+        result = shared_flight(key, fn, timeout)
+    except BaseException:
+        flight.failed = True
+        raise
+    else:
+        flight.result = result
+    finally:
+        with in_flight_lock:
+            del in_flight[key]
+        flight.done.set()
+    return result
+
+
+def shared_flight(key, fn, timeout):
+    """
+    single_flight across processes: the leader holds a pending marker with
+    a token of its own in the cache and stores its result under that token,
+    where only the callers that saw the marker look for it
+    """
+    pending_key = f"sf:{key}:pending"
+    token = uuid.uuid4().hex
+    try:
+        leader = cache.add(pending_key, token, timeout)
+        found = None if leader else wait_for_flight(pending_key, timeout)
+    except Exception:
+        # Cache backend down: coalesce within this process only
+        return fn()
+    if found is not None:
+        coalesced_requests.inc()
+        return found
+    if not leader:
+        return fn()
+
+    succeeded = False
+    try:
+        result = fn()
+        succeeded = True
+    finally:
+        try:
+            if succeeded:
+                cache.set(f"{pending_key}:{token}", result, timeout)
+            cache.delete(pending_key)
+        except Exception:
+            # The waiters give up on the marker's timeout
+            pass
+    return result
+
+
+def wait_for_flight(pending_key, timeout):
+    """The result of the call in flight in another process, or None"""
+    token = cache.get(pending_key)
+    if token is None:
+        return None
+    result_key = f"{pending_key}:{token}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        values = cache.get_many([pending_key, result_key])
+        if result_key in values:
+            return values[result_key]
+        if values.get(pending_key) != token:
+            # Failed, or finished after this read of the result
+            return cache.get(result_key)
+        time.sleep(COALESCE_POLL)
+    return None
@@ -1,19 +1,44 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, async_views, views
 
-urlpatterns = [
-    path("", views.index, name="index"),
-    path("login", views.login_view, name="login"),
-    path("logout", views.logout_view, name="logout"),
-    path("register", views.register, name="register"),
-    path("create", views.create_listing, name="create_listing"),
-    path("listing/<int:id>", views.listing, name="listing"),
-    path("category", views.display_category, name="display_category"),
-    path("remove_watchlist/<int:id>", views.remove_watchlist, name="remove_watchlist"),
-    path("add_watchlist/<int:id>", views.add_watchlist, name="add_watchlist"),
-    path("watchlist", views.watchlist, name="watchlist"),
-    path("add_comment/<int:id>", views.add_comment, name="add_comment"),
-    path("add_bid/<int:id>", views.add_bid, name="add_bid"),
-    path("close_auction/<int:id>", views.close_auction, name="close_auction"),
-]
+
+def build_urlpatterns(read_views):
+    """`read_views` serves index, listing, category and watchlist pages"""
+    return [
+        path("", read_views.index, name="index"),
+        path("trending", read_views.trending, name="trending"),
+        path("ending-soon", read_views.ending_soon, name="ending_soon"),
+        path("login", views.login_view, name="login"),
+        path("logout", views.logout_view, name="logout"),
+        path("register", views.register, name="register"),
+        path("create", views.create_listing, name="create_listing"),
+        path("listing/<int:id>", read_views.listing, name="listing"),
+        path("listing/<int:id>/events", views.listing_events, name="listing_events"),
+        path("listing/<int:id>/comments", views.listing_comments, name="listing_comments"),
+        path("listing/<int:id>/bids", views.listing_bids, name="listing_bids"),
+        path("listing/<int:id>/bids/series", views.listing_price_series, name="listing_price_series"),
+        path("bids", views.user_bids, name="user_bids"),
+        path("category", read_views.display_category, name="display_category"),
+        path("search", views.search, name="search"),
+        path("remove_watchlist/<int:id>", views.remove_watchlist, name="remove_watchlist"),
+        path("add_watchlist/<int:id>", views.add_watchlist, name="add_watchlist"),
+        path("watchlist", read_views.watchlist, name="watchlist"),
+        path("watchlist/add", views.bulk_add_watchlist, name="bulk_add_watchlist"),
+        path("watchlist/remove", views.bulk_remove_watchlist, name="bulk_remove_watchlist"),
+        path("add_comment/<int:id>", views.add_comment, name="add_comment"),
+        path("add_bid/<int:id>", views.add_bid, name="add_bid"),
+        path("close_auction/<int:id>", views.close_auction, name="close_auction"),
+        path("metrics", views.metrics, name="metrics"),
+        path("export/<slug:dataset>.<slug:format>", views.export_data, name="export_data"),
+        path("api/listings", api.listings, name="api_listings"),
+        path("api/listings/<int:id>", api.listing, name="api_listing"),
+        path("api/categories", api.categories, name="api_categories"),
+        path("api/watchlist", api.watchlist, name="api_watchlist"),
+    ]
+
+
+urlpatterns = build_urlpatterns(
+    async_views if settings.AUCTIONS_ASYNC_VIEWS else views
+)
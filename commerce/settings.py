@@ -41,12 +41,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its latency covers the rest of the stack
+    'auctions.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'auctions.routers.PrimaryStickinessMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -54,7 +57,8 @@ ROOT_URLCONF = 'commerce.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django backend, timing renders for the instrumentation middleware
+        'BACKEND': 'auctions.instrumentation.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'auctions.context_processors.categories',
             ],
         },
     },
@@ -74,15 +79,133 @@ WSGI_APPLICATION = 'commerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# SQLite by default. AUCTIONS_DB_ENGINE=postgresql selects PostgreSQL
+# (needs `pip install psycopg`) configured by the AUCTIONS_DB_* variables,
+# with connections kept open between requests for AUCTIONS_DB_CONN_MAX_AGE
+# seconds. Setting AUCTIONS_DB_REPLICA_HOST (or AUCTIONS_DB_REPLICA_NAME, a
+# second file for SQLite) adds a read replica that the read-only pages use.
+
+# AUCTIONS_SQLITE_TUNED=1 opts into WAL, a busy timeout and write-locking
+# transactions on the bid and close paths (see auctions/backends/sqlite3).
+
+SQLITE_ENGINES = {
+    False: 'django.db.backends.sqlite3',
+    True: 'auctions.backends.sqlite3',
+}
+
+
+def database(prefix, default_name):
+    if os.environ.get('AUCTIONS_DB_ENGINE', 'sqlite3') == 'postgresql':
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get(f'{prefix}NAME', 'commerce'),
+            'USER': os.environ.get(f'{prefix}USER', os.environ.get('AUCTIONS_DB_USER', '')),
+            'PASSWORD': os.environ.get(f'{prefix}PASSWORD', os.environ.get('AUCTIONS_DB_PASSWORD', '')),
+            'HOST': os.environ.get(f'{prefix}HOST', ''),
+            'PORT': os.environ.get(f'{prefix}PORT', os.environ.get('AUCTIONS_DB_PORT', '')),
+            'CONN_MAX_AGE': int(os.environ.get('AUCTIONS_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    return {
+        'ENGINE': SQLITE_ENGINES[os.environ.get('AUCTIONS_SQLITE_TUNED', '0') == '1'],
+        'NAME': os.environ.get(f'{prefix}NAME', default_name),
     }
+
+
+DATABASES = {
+    'default': database('AUCTIONS_DB_', os.path.join(BASE_DIR, 'db.sqlite3')),
 }
 
+if os.environ.get('AUCTIONS_DB_REPLICA_HOST') or os.environ.get('AUCTIONS_DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **database('AUCTIONS_DB_REPLICA_', os.path.join(BASE_DIR, 'replica.sqlite3')),
+        # Tests run against the primary only
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['auctions.routers.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a write, so it sees
+# its own bids and comments despite replication lag
+AUCTIONS_REPLICA_STICKY_SECONDS = int(
+    os.environ.get('AUCTIONS_REPLICA_STICKY_SECONDS', '10')
+)
+
 AUTH_USER_MODEL = 'auctions.User'
 
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Pick the backend with AUCTIONS_CACHE=locmem|file|redis; the redis backend
+# needs the `redis` package and a local Redis-compatible server.
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auctions',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'AUCTIONS_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')
+        ),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get(
+            'AUCTIONS_CACHE_LOCATION', 'redis://127.0.0.1:6379'
+        ),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('AUCTIONS_CACHE', 'locmem')]
+}
+
+
+# Serve the read-heavy pages with the async views; commerce/asgi.py turns
+# this on by default.
+
+AUCTIONS_ASYNC_VIEWS = os.environ.get('AUCTIONS_ASYNC_VIEWS') == '1'
+
+
+# Pub/sub used to push live listing updates to event stream subscribers.
+# The in-process broker only reaches subscribers of the same process.
+
+AUCTIONS_EVENT_BROKER = os.environ.get(
+    'AUCTIONS_EVENT_BROKER', 'auctions.events.InProcessBroker'
+)
+
+
+# Addresses allowed to scrape the Prometheus metrics at /metrics
+
+METRICS_ALLOWED_IPS = os.environ.get(
+    'AUCTIONS_METRICS_ALLOWED_IPS', '127.0.0.1,::1'
+).split(',')
+
+
+# Request instrumentation: per-view timings are exported at /metrics and,
+# unless disabled, sent to the browser in a Server-Timing header. Requests
+# running more queries than the budget are logged (0 disables the check).
+
+AUCTIONS_SERVER_TIMING = os.environ.get('AUCTIONS_SERVER_TIMING', '1') == '1'
+
+AUCTIONS_QUERY_BUDGET = int(os.environ.get('AUCTIONS_QUERY_BUDGET', '30'))
+
+
+# Token-bucket rate limits of the bid, comment and watchlist endpoints, as
+# (requests per minute, burst) per signed-in user and per client address.
+# Buckets live in the cache, or in process memory while the cache is
+# unreachable. AUCTIONS_RATE_LIMIT=0 turns them off.
+
+AUCTIONS_RATE_LIMIT = os.environ.get('AUCTIONS_RATE_LIMIT', '1') == '1'
+
+AUCTIONS_RATE_LIMITS = {
+    'bid': {'user': (30, 10), 'ip': (120, 40)},
+    'comment': {'user': (10, 5), 'ip': (60, 20)},
+    'watchlist': {'user': (60, 20), 'ip': (240, 60)},
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
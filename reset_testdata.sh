@@ -14,9 +14,10 @@ fi
 echo "Running migrations..."
 .venv/bin/python manage.py migrate
 
-# Populate with fresh test data
+# Populate with fresh test data (pass --bulk and its options for a large
+# synthetic dataset, e.g. ./reset_testdata.sh --bulk --listings 20000)
 echo "Populating test data..."
-.venv/bin/python manage.py populate_testdata
+.venv/bin/python manage.py populate_testdata "$@"
 
 echo ""
 echo "✅ Done!"